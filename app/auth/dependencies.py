@@ -1,19 +1,44 @@
+import hmac
+
 from fastapi import Request, HTTPException, Depends
+from fastapi.concurrency import run_in_threadpool
 from firebase_admin import auth, exceptions
 
+from app import config
+from app.auth.firebase import get_firebase_app
+from app.auth.token_cache import token_cache
+from app.tools.metrics import observe_stage
+
 async def get_current_user(request: Request):
     auth_header = request.headers.get("Authorization")
     if not auth_header or not auth_header.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Invalid or missing Authorization header")
 
     token = auth_header.split(" ")[1]
+    with observe_stage("auth", "cache"):
+        cached_token = token_cache.get(token)
+    if cached_token:
+        return cached_token
+
     try:
-        # Verifies the token and returns user claims
-        decoded_token = auth.verify_id_token(token, clock_skew_seconds=60)
+        # Verifies the token off the event loop and returns user claims
+        with observe_stage("auth", "verify"):
+            decoded_token = await run_in_threadpool(auth.verify_id_token, token, app=get_firebase_app(), clock_skew_seconds=60)
+        token_cache.put(token, decoded_token)
         return decoded_token
     except exceptions.FirebaseError as e:
         # Firebase-specific exception handling
         raise HTTPException(status_code=401, detail=f"Token verification failed: {str(e)}")
     except Exception:
         # Catch-all for any unexpected errors
-        raise HTTPException(status_code=401, detail="Token verification failed")
\ No newline at end of file
+        raise HTTPException(status_code=401, detail="Token verification failed")
+
+
+def is_admin(headers) -> bool:
+    token = headers.get("X-Admin-Token")
+    return bool(config.ADMIN_TOKEN and token and hmac.compare_digest(token, config.ADMIN_TOKEN))
+
+
+async def require_admin(request: Request):
+    if not is_admin(request.headers):
+        raise HTTPException(status_code=403, detail="Admin token required")
@@ -1,5 +1,55 @@
+import asyncio
+import logging
+
 import firebase_admin
-from firebase_admin import credentials
+from fastapi.concurrency import run_in_threadpool
+from firebase_admin import auth, credentials
+
+from app import config
+
+logger = logging.getLogger(__name__)
+
+_app = None
+
+
+def get_firebase_app():
+    """
+    The Firebase app, initialized from `FIREBASE_CREDENTIALS` on first use
+    rather than at import time.
+    """
+    global _app
+    if _app is None:
+        try:
+            _app = firebase_admin.get_app()
+        except ValueError:
+            _app = firebase_admin.initialize_app(credentials.Certificate(config.FIREBASE_CREDENTIALS))
+    return _app
+
+
+def firebase_ready() -> bool:
+    try:
+        get_firebase_app()
+        return True
+    except Exception as e:
+        logger.warning("Firebase is not initialized: %s", e)
+        return False
+
+
+def refresh_public_keys():
+    """
+    Fetch the ID token signing certificates through firebase_admin's own
+    cache-control session, so request-time verification finds them cached.
+    """
+    from firebase_admin import _token_gen
+
+    verifier = auth._get_client(get_firebase_app())._token_verifier
+    verifier.request(_token_gen.ID_TOKEN_CERT_URI)
+
 
-cred = credentials.Certificate("serviceAccountKey.json")
-firebase_admin.initialize_app(cred)
+async def keep_public_keys_fresh(interval: int = config.PUBLIC_KEY_REFRESH_SECONDS):
+    while True:
+        try:
+            await run_in_threadpool(refresh_public_keys)
+        except Exception:
+            logger.warning("Failed to refresh Firebase public keys", exc_info=True)
+        await asyncio.sleep(interval)
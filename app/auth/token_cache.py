@@ -0,0 +1,55 @@
+import hashlib
+import time
+
+from collections import OrderedDict
+
+from app import config
+
+
+class TokenCache:
+    """
+    Verified ID token claims keyed by a SHA-256 digest of the token. Each entry
+    expires at the token's own `exp`, so a cached token is never accepted for
+    longer than Firebase would accept it.
+    """
+
+    def __init__(self, max_entries: int = config.TOKEN_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries: OrderedDict[str, tuple[dict, float]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str):
+        key = self._key(token)
+        entry = self.entries.get(key)
+        if entry and entry[1] > time.time():
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+        if entry:
+            del self.entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, token: str, claims: dict):
+        expires_at = claims.get("exp")
+        if not expires_at or expires_at <= time.time():
+            return
+        key = self._key(token)
+        self.entries[key] = (claims, float(expires_at))
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self):
+        return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses}
+
+
+token_cache = TokenCache()
@@ -0,0 +1,127 @@
+import os
+from dotenv import load_dotenv
+
+
+load_dotenv()
+
+# Transcription jobs
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", "3600"))
+# Job state shared by every API worker on the host, so polls can reach any worker; empty keeps jobs in memory
+JOBS_DB = os.getenv("JOBS_DB", ".cache/jobs.sqlite3")
+
+# Whisper inference pool
+WHISPER_MODEL = os.getenv("WHISPER_MODEL", "small")
+# Faster models a job may be moved to when the queue is long, best first (e.g. "base,tiny"); empty disables it
+WHISPER_FALLBACK_MODELS = [name.strip() for name in os.getenv("WHISPER_FALLBACK_MODELS", "").split(",") if name.strip()]
+# Expected wait (queue plus the job itself, in seconds) past which a job drops one more tier, one value per step
+MODEL_DOWNGRADE_SECONDS = [float(value) for value in os.getenv("MODEL_DOWNGRADE_SECONDS", "120,600").split(",") if value.strip()]
+# Load the fallback models during warm-up as well, instead of on first use
+WHISPER_PRELOAD_TIERS = os.getenv("WHISPER_PRELOAD_TIERS", "false").lower() in ("1", "true", "yes")
+WHISPER_WORKERS = int(os.getenv("WHISPER_WORKERS", "1"))
+# torch intra-op threads per worker; 0 splits the machine's cores evenly across workers
+WHISPER_THREADS = int(os.getenv("WHISPER_THREADS", "0"))
+# "default" (whisper.load_model as is) or "int8" (dynamic int8 quantization, CPU only)
+WHISPER_BACKEND = os.getenv("WHISPER_BACKEND", "default")
+# torch device for the model ("cpu", "cuda", ...); empty lets Whisper pick cuda when available
+WHISPER_DEVICE = os.getenv("WHISPER_DEVICE") or None
+# Load the model in every worker at startup instead of on the first request
+WHISPER_WARMUP = os.getenv("WHISPER_WARMUP", "true").lower() in ("1", "true", "yes")
+# Clips of up to 30 seconds from concurrent requests are batched into one forward pass; 1 disables it
+WHISPER_BATCH_SIZE = int(os.getenv("WHISPER_BATCH_SIZE", "8"))
+WHISPER_BATCH_WAIT_MS = float(os.getenv("WHISPER_BATCH_WAIT_MS", "10"))
+
+# "local" runs the Whisper pool inside each API process; "remote" sends Whisper calls to a shared
+# inference server (python -m app.tools.inference_server) so API workers don't each load the model
+INFERENCE_MODE = os.getenv("INFERENCE_MODE", "local")
+INFERENCE_SOCKET = os.getenv("INFERENCE_SOCKET", "/tmp/lecturecap-inference.sock")
+# Number of API worker processes sharing the inference server (uvicorn takes --workers from WEB_CONCURRENCY)
+API_WORKERS = int(os.getenv("API_WORKERS", os.getenv("WEB_CONCURRENCY", "1")))
+
+# Segmented transcription: long recordings are cut on silence and transcribed in parallel
+SEGMENT_MAX_SECONDS = float(os.getenv("SEGMENT_MAX_SECONDS", "120"))
+SEGMENT_MIN_SECONDS = float(os.getenv("SEGMENT_MIN_SECONDS", "30"))
+SILENCE_THRESHOLD_DB = float(os.getenv("SILENCE_THRESHOLD_DB", "-35"))
+SILENCE_MIN_SECONDS = float(os.getenv("SILENCE_MIN_SECONDS", "0.5"))
+# Pauses longer than TRIM_MIN_SILENCE_SECONDS are cut down to TRIM_KEEP_SECONDS before Whisper runs
+TRIM_SILENCE = os.getenv("TRIM_SILENCE", "true").lower() in ("1", "true", "yes")
+TRIM_MIN_SILENCE_SECONDS = float(os.getenv("TRIM_MIN_SILENCE_SECONDS", "2"))
+TRIM_KEEP_SECONDS = float(os.getenv("TRIM_KEEP_SECONDS", "0.5"))
+# Streaming transcription uses shorter chunks so the first segments arrive quickly
+STREAM_CHUNK_SECONDS = float(os.getenv("STREAM_CHUNK_SECONDS", "30"))
+
+# Finished Whisper chunks are checkpointed so a retried recording resumes where it stopped; empty disables it
+CHECKPOINT_DB = os.getenv("CHECKPOINT_DB", ".cache/checkpoints.sqlite3")
+CHECKPOINT_RETENTION_SECONDS = int(os.getenv("CHECKPOINT_RETENTION_SECONDS", str(7 * 24 * 3600)))
+# Non-segmented recordings longer than this are transcribed chunk by chunk so progress can be checkpointed
+CHECKPOINT_MIN_SECONDS = float(os.getenv("CHECKPOINT_MIN_SECONDS", "600"))
+
+# Transcript cache keyed by audio hash, model and prompt version
+TRANSCRIPT_CACHE_DIR = os.getenv("TRANSCRIPT_CACHE_DIR", ".cache/transcripts")
+TRANSCRIPT_CACHE_MAX_BYTES = int(os.getenv("TRANSCRIPT_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+# Google Drive HTTP client
+# Base URL of the Drive API; pointed at a local stand-in by the load test
+DRIVE_API_URL = os.getenv("DRIVE_API_URL", "https://www.googleapis.com").rstrip("/")
+DRIVE_MAX_CONNECTIONS = int(os.getenv("DRIVE_MAX_CONNECTIONS", "50"))
+DRIVE_TIMEOUT_SECONDS = float(os.getenv("DRIVE_TIMEOUT_SECONDS", "60"))
+DRIVE_CONNECT_TIMEOUT_SECONDS = float(os.getenv("DRIVE_CONNECT_TIMEOUT_SECONDS", "5"))
+DRIVE_MAX_RETRIES = int(os.getenv("DRIVE_MAX_RETRIES", "4"))
+DRIVE_BACKOFF_SECONDS = float(os.getenv("DRIVE_BACKOFF_SECONDS", "0.5"))
+DRIVE_MAX_BACKOFF_SECONDS = float(os.getenv("DRIVE_MAX_BACKOFF_SECONDS", "16"))
+
+# Decoded audio above this many bytes (16 kHz float32, about 64 KB per second) is spilled to disk
+AUDIO_MEMORY_LIMIT_BYTES = int(os.getenv("AUDIO_MEMORY_LIMIT_BYTES", str(512 * 1024 * 1024)))
+
+# Per-user notes.json cache and conditional writes
+NOTES_CACHE_MAX_USERS = int(os.getenv("NOTES_CACHE_MAX_USERS", "10000"))
+NOTES_MAX_RETRIES = int(os.getenv("NOTES_MAX_RETRIES", "3"))
+
+# Transcription scheduling: concurrent Whisper jobs, fairness and per-user quotas (in seconds of audio).
+# Limits are for the whole deployment: with a shared inference server every API worker runs its own
+# scheduler, so each one enforces its share of the slots, quotas and per-user concurrency
+SCHEDULER_SHARE = API_WORKERS if INFERENCE_MODE == "remote" else 1
+SCHEDULER_SLOTS = float(os.getenv("SCHEDULER_SLOTS", str(WHISPER_WORKERS))) / SCHEDULER_SHARE
+SCHEDULER_USER_CONCURRENCY = max(1, int(os.getenv("SCHEDULER_USER_CONCURRENCY", "1")) // SCHEDULER_SHARE)
+# Requests that would wait longer than this for Whisper get 429 with Retry-After
+SCHEDULER_MAX_WAIT_SECONDS = float(os.getenv("SCHEDULER_MAX_WAIT_SECONDS", "600"))
+# Initial guess of Whisper seconds per second of audio, refined from finished jobs
+SCHEDULER_REALTIME_FACTOR = float(os.getenv("SCHEDULER_REALTIME_FACTOR", "0.5"))
+# Audio seconds an admitted request is assumed to need until its recording is decoded
+SCHEDULER_RESERVE_SECONDS = float(os.getenv("SCHEDULER_RESERVE_SECONDS", "600"))
+SCHEDULER_MAX_USERS = int(os.getenv("SCHEDULER_MAX_USERS", "10000"))
+USER_QUOTA_AUDIO_SECONDS = float(os.getenv("USER_QUOTA_AUDIO_SECONDS", str(4 * 3600))) / SCHEDULER_SHARE
+USER_QUOTA_AUDIO_SECONDS_PER_HOUR = float(os.getenv("USER_QUOTA_AUDIO_SECONDS_PER_HOUR", str(2 * 3600))) / SCHEDULER_SHARE
+
+# Batch transcription
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "20"))
+
+# Firebase auth
+FIREBASE_CREDENTIALS = os.getenv("FIREBASE_CREDENTIALS", "serviceAccountKey.json")
+TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "10000"))
+# How often the Firebase public keys are re-fetched in the background
+PUBLIC_KEY_REFRESH_SECONDS = int(os.getenv("PUBLIC_KEY_REFRESH_SECONDS", "1800"))
+
+# Gemini
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "4"))
+GEMINI_BACKOFF_SECONDS = float(os.getenv("GEMINI_BACKOFF_SECONDS", "1"))
+GEMINI_MAX_BACKOFF_SECONDS = float(os.getenv("GEMINI_MAX_BACKOFF_SECONDS", "30"))
+# Hedging sends a second request when the first is slower than the observed p95
+GEMINI_HEDGE = os.getenv("GEMINI_HEDGE", "false").lower() in ("1", "true", "yes")
+GEMINI_HEDGE_MIN_SAMPLES = int(os.getenv("GEMINI_HEDGE_MIN_SAMPLES", "20"))
+GEMINI_LATENCY_WINDOW = int(os.getenv("GEMINI_LATENCY_WINDOW", "200"))
+
+# Chunked (map-reduce) processing of long transcripts
+CHUNKED_THRESHOLD_TOKENS = int(os.getenv("CHUNKED_THRESHOLD_TOKENS", "6000"))
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "3000"))
+MAX_CHUNKS = int(os.getenv("MAX_CHUNKS", "16"))
+CHUNK_FANOUT = int(os.getenv("CHUNK_FANOUT", "4"))
+CHARS_PER_TOKEN = int(os.getenv("CHARS_PER_TOKEN", "4"))
+
+# Admin endpoints and request profiling; admin access is disabled while ADMIN_TOKEN is empty
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+# Fraction of requests profiled at random, on top of admin requests sent with `X-Profile: 1`
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", ".cache/profiles")
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "100"))
@@ -1,12 +1,48 @@
+import asyncio
 import uvicorn
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Depends
+from fastapi.responses import JSONResponse, Response
+from prometheus_client import CONTENT_TYPE_LATEST
 from fastapi.openapi.utils import get_openapi
 from fastapi.openapi.models import SecuritySchemeType
 
 from fastapi.security import HTTPBearer
-from app.routers import transcribe, summarize
-from app.auth.dependencies import get_current_user
+from app.routers import admin, transcribe, summarize
+from app.auth.dependencies import get_current_user, require_admin
+from app import config
+from app.auth.firebase import firebase_ready, keep_public_keys_fresh
+from app.tools.drive import drive
+from app.tools.inference import inference_pool
+from app.tools.jobs import job_runner
+from app.tools.metrics import keep_in_flight_fresh, mark_process_dead, multiprocess_dir, render_metrics
+from app.tools.checkpoints import checkpoint_store
+from app.tools.model_policy import model_policy
+from app.tools.profiling import ProfilingMiddleware
+from app.tools.scheduler import scheduler
+from app.tools.transcript_cache import transcript_cache
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    drive.start()
+    inference_pool.start()
+    # Model loading runs in the background; /ready reports when it is done
+    warm_up = asyncio.create_task(inference_pool.warm_up()) if config.WHISPER_WARMUP else None
+    key_refresher = asyncio.create_task(keep_public_keys_fresh())
+    in_flight_refresher = asyncio.create_task(keep_in_flight_fresh()) if multiprocess_dir() else None
+    yield
+    key_refresher.cancel()
+    if in_flight_refresher:
+        in_flight_refresher.cancel()
+    if warm_up:
+        warm_up.cancel()
+    await job_runner.stop()
+    inference_pool.stop()
+    await drive.close()
+    mark_process_dead()
+
 
 app = FastAPI(
     title="Lecture Cap API",
@@ -20,7 +56,8 @@ app = FastAPI(
     servers=[{
         'url': 'http://lcapapiv1noip.ddns.net',
         'description': 'Main Production Server'
-    }]
+    }],
+    lifespan=lifespan,
 )
 
 # Secure routers
@@ -38,6 +75,15 @@ app.include_router(
     dependencies=[Depends(get_current_user)]
 )
 
+app.include_router(
+    admin.router,
+    prefix="/admin",
+    tags=["Admin"],
+    dependencies=[Depends(require_admin)]
+)
+
+app.add_middleware(ProfilingMiddleware)
+
 @app.get(
     "/",
     tags=["Root"],
@@ -63,14 +109,56 @@ def root():
     "/ping",
     tags=["Health Check"],
     summary="Health check endpoint",
-    description="Simple endpoint to verify if the API is running.",
+    description="Simple endpoint to verify if the API is running. Also reports the health of the Whisper inference worker pool and transcript cache hit/miss counters.",
     responses={
         200: {
             "description": "API is healthy and reachable",
             "content": {
                 "application/json": {
                     "example": {
-                        "status": "ok"
+                        "status": "ok",
+                        "inference_pool": {
+                            "model": "small",
+                            "tiers": ["small", "base", "tiny"],
+                            "backend": "default",
+                            "device": "auto",
+                            "warmed": True,
+                            "size": 2,
+                            "threads_per_worker": 4,
+                            "alive": 2,
+                            "in_flight": 1,
+                            "completed": 12,
+                            "failed": 0,
+                            "restarts": 0
+                        },
+                        "transcript_cache": {
+                            "entries": 42,
+                            "bytes": 1048576,
+                            "max_bytes": 536870912,
+                            "hits": {"transcript": 3, "rephrase": 5},
+                            "misses": {"transcript": 10, "rephrase": 11},
+                            "evictions": 0
+                        },
+                        "scheduler": {
+                            "slots": 2,
+                            "in_use": 1,
+                            "running_users": 1,
+                            "waiting": 0,
+                            "waiting_users": 0,
+                            "reserved": 0,
+                            "realtime_factor": 0.42,
+                            "rejected": 0
+                        },
+                        "checkpoints": {
+                            "enabled": True,
+                            "resumed_chunks": 0,
+                            "saved_chunks": 42
+                        },
+                        "model_policy": {
+                            "tiers": ["small", "base", "tiny"],
+                            "downgrade_seconds": [120.0, 600.0],
+                            "chosen": {"small": 30, "base": 4}
+                        }
                     }
                 }
             }
@@ -78,7 +166,54 @@ def root():
     }
 )
 def ping():
-    return {"status": "ok"}
+    return {
+        "status": "ok",
+        "inference_pool": inference_pool.health(),
+        "transcript_cache": transcript_cache.stats(),
+        "scheduler": scheduler.stats(),
+        "checkpoints": checkpoint_store.stats(),
+        "model_policy": model_policy.stats(),
+    }
+
+@app.get(
+    "/ready",
+    tags=["Health Check"],
+    summary="Readiness check endpoint",
+    description="Reports whether the API can serve requests: Firebase is initialized and the Whisper workers have loaded the model (when `WHISPER_WARMUP` is on). Returns 503 until then. Use `/ping` for liveness.",
+    responses={
+        200: {
+            "description": "API is ready to serve requests",
+            "content": {
+                "application/json": {
+                    "example": {"status": "ready", "checks": {"firebase": True, "inference_pool": True}}
+                }
+            }
+        },
+        503: {
+            "description": "API is still starting up",
+            "content": {
+                "application/json": {
+                    "example": {"status": "starting", "checks": {"firebase": True, "inference_pool": False}}
+                }
+            }
+        }
+    }
+)
+def ready():
+    checks = {"firebase": firebase_ready(), "inference_pool": inference_pool.ready()}
+    if not all(checks.values()):
+        return JSONResponse(status_code=503, content={"status": "starting", "checks": checks})
+    return {"status": "ready", "checks": checks}
+
+@app.get(
+    "/metrics",
+    tags=["Health Check"],
+    summary="Prometheus metrics",
+    description="Per-stage latency histograms (`lecturecap_stage_duration_seconds` by pipeline and stage: download, transcribe, rephrase, save, Gemini calls, auth), errors by stage, audio seconds transcribed, bytes downloaded from Drive, Gemini tokens and in-flight work, in Prometheus text format.",
+    responses={200: {"description": "Prometheus exposition format", "content": {"text/plain": {}}}},
+)
+def metrics():
+    return Response(render_metrics(), media_type=CONTENT_TYPE_LATEST)
 
 # ✅ Inject Bearer token into Swagger
 def custom_openapi():
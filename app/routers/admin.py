@@ -0,0 +1,55 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse
+
+from app.tools.profiling import profile_store
+
+router = APIRouter()
+
+
+@router.get(
+    "/profiles",
+    summary="List captured request profiles",
+    description="Newest first. Profiles are captured for admin requests sent with `X-Profile: 1` and for `PROFILE_SAMPLE_RATE` of all requests; only the newest `PROFILE_MAX_FILES` are kept.",
+    responses={
+        200: {
+            "description": "Profile metadata",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "profiles": [{
+                            "id": "9f1c2b7e4d8a4e0f8b6a3c5d7e9f1a2b",
+                            "method": "POST",
+                            "path": "/transcribe/",
+                            "reason": "header",
+                            "status_code": 200,
+                            "started_at": 1718000000.0,
+                            "duration_seconds": 84.2,
+                            "interval_ms": 5,
+                            "samples": 16840
+                        }]
+                    }
+                }
+            }
+        },
+        403: {"description": "Missing or wrong `X-Admin-Token`"}
+    }
+)
+async def list_profiles():
+    return {"profiles": profile_store.list()}
+
+
+@router.get(
+    "/profiles/{profile_id}",
+    summary="Download a request profile",
+    description="Collapsed stacks (`thread;outer;inner count` per line), ready for flamegraph.pl or speedscope. Stacks sampled inside Whisper workers are rooted at `worker-<pid>`.",
+    responses={
+        200: {"description": "Collapsed stacks", "content": {"text/plain": {}}},
+        403: {"description": "Missing or wrong `X-Admin-Token`"},
+        404: {"description": "Profile not found or already evicted"}
+    }
+)
+async def get_profile(profile_id: str):
+    path = profile_store.path(profile_id)
+    if not path:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain", filename=f"{profile_id}.collapsed")
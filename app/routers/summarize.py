@@ -1,12 +1,15 @@
 import os
 
 from dotenv import load_dotenv
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from google import genai
 
-from app.tools.genai_client import generate_content
-from app.tools.utils import clean_text
+from app.tools.chunking import map_chunks, needs_chunking, split_text
+from app.tools.genai_client import generate_content_async, generate_content_stream_async, to_http_exception
+from app.tools.metrics import observe_stage
+from app.tools.utils import StreamingTextCleaner, clean_text, sse_event
 from app.auth.dependencies import get_current_user
 
 router = APIRouter()
@@ -18,7 +21,7 @@ class TextRequest(BaseModel):
 @router.post(
     "/",
     summary="Summarize lecture text using AI",
-    description="Accepts lecture text and returns a concise summary using AI. Requires Bearer token authentication.",
+    description="Accepts lecture text and returns a concise summary using AI. Requires Bearer token authentication. With `?stream=true` the summary is sent as Server-Sent Events (`summary` events carrying text chunks, then `done`) while it is generated.",
     responses={
         200: {
             "description": "Successful summary generation",
@@ -27,6 +30,13 @@ class TextRequest(BaseModel):
                     "example": {
                         "summary": "The lecture covered reinforcement learning concepts such as MDPs and Q-learning."
                     }
+                },
+                "text/event-stream": {
+                    "example": (
+                        'event: summary\ndata: {"text": "The lecture covered reinforcement learning"}\n\n'
+                        'event: summary\ndata: {"text": " concepts such as MDPs and Q-learning."}\n\n'
+                        'event: done\ndata: {}\n\n'
+                    )
                 }
             }
         },
@@ -54,6 +64,14 @@ class TextRequest(BaseModel):
                 }
             }
         },
+        429: {
+            "description": "Too Many Requests - AI service is rate limited, retry after the `Retry-After` header",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "AI service is rate limited, please retry later"}
+                }
+            }
+        },
         500: {
             "description": "Internal Server Error - AI summarization failed",
             "content": {
@@ -64,12 +82,64 @@ class TextRequest(BaseModel):
         }
     }
 )
-async def summarize_text(request: TextRequest, user_data: any = Depends(get_current_user)):
-    try:
-        response = generate_content(
-            contents=f"Summarize this lecture with output following the text language: {request.text}",
+async def summarize_text(
+    request: TextRequest,
+    stream: bool = Query(False, description="Stream the summary as Server-Sent Events while it is generated"),
+    user_data: any = Depends(get_current_user),
+):
+    if stream:
+        return StreamingResponse(
+            stream_summary(request.text),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
         )
+    try:
+        contents = await summary_prompt(request.text)
+        with observe_stage("summarize", "generate"):
+            response = await generate_content_async(contents=contents)
         output = clean_text(response.text)
         return {"summary": output}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise to_http_exception(e)
+
+
+async def summary_prompt(text: str) -> str:
+    """
+    Prompt for the final summary call. Long transcripts are summarized map-reduce
+    style: token-bounded chunks are summarized concurrently here, and the final
+    call merges the partial summaries.
+    """
+    if not needs_chunking(text):
+        return f"Summarize this lecture with output following the text language: {text}"
+
+    async def summarize_part(chunk: str):
+        response = await generate_content_async(
+            contents=f"Summarize this part of a lecture with output following the text language: {chunk}",
+        )
+        return clean_text(response.text)
+
+    with observe_stage("summarize", "map"):
+        partials = await map_chunks(split_text(text), summarize_part)
+    joined = "\n\n".join(f"Part {i}:\n{partial}" for i, partial in enumerate(partials, 1))
+    return (
+        "These are summaries of consecutive parts of one lecture. Combine them into a single "
+        f"summary of the whole lecture with output following the text language: {joined}"
+    )
+
+
+async def stream_summary(text: str):
+    cleaner = StreamingTextCleaner()
+    try:
+        contents = await summary_prompt(text)
+        with observe_stage("summarize", "generate_stream"):
+            async for chunk in generate_content_stream_async(contents=contents):
+                output = cleaner.feed(chunk.text or "")
+                if output:
+                    yield sse_event("summary", {"text": output})
+        output = cleaner.flush()
+        if output:
+            yield sse_event("summary", {"text": output})
+        yield sse_event("done", {})
+    except Exception as e:
+        error = to_http_exception(e)
+        yield sse_event("error", {"status_code": error.status_code, "detail": error.detail})
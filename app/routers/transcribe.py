@@ -1,23 +1,31 @@
-import os
-import requests
-import whisper
-import tempfile
-import json
+import asyncio
+import math
 
+from typing import Literal
 from uuid import UUID
 from pydantic import BaseModel, Field
 from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
 
+from app import config
 from app.auth.dependencies import get_current_user
 
-from app.tools.genai_client import generate_content
-from app.tools.utils import clean_text
+from app.tools.genai_client import generate_content_async, to_http_exception
+from app.tools.inference import BATCH_CLIP_SECONDS, inference_pool
+from app.tools.jobs import Job, StageTimer, job_runner
+from app.tools.metrics import AUDIO_SECONDS, AUDIO_TRIMMED_SECONDS, StageObserver, observe_stage
+from app.tools.model_policy import model_policy
+from app.tools.notes import notes_store
+from app.tools.scheduler import Reservation, current_reservation, scheduler
+from app.tools.transcript_cache import transcript_cache
+from app.tools.audio import SAMPLE_RATE, DecodedAudio
+from app.tools.checkpoints import checkpoint_store
+from app.tools.chunking import map_chunks, needs_chunking, split_text
+from app.tools.drive import drive
+from app.tools.utils import clean_text, parse_json_object, sse_event
 
 
-# Load the Whisper model
-model = whisper.load_model("small")
-
 router = APIRouter()
 
 
@@ -25,49 +33,143 @@ class TranscribeRequest(BaseModel):
     file_id: str = Field(..., example="1abc23XYZfileId")
     access_token: str = Field(..., example="ya29.a0ARrdaM-example-access-token")
     note_id: UUID
+    segmented: bool = Field(False, description="Split long recordings on silence and transcribe the parts in parallel")
+    summarize: bool = Field(False, description="Also write a summary in the same Gemini call and store it on the note")
+    quality: Literal["auto", "fast", "best"] = Field(
+        "auto",
+        description="Whisper model choice: `auto` drops to a faster model when the queue is long, `fast` always uses the fastest one, `best` always uses the default model (use it to upgrade a note transcribed with a faster model)",
+    )
+
+class BatchItem(BaseModel):
+    file_id: str = Field(..., example="1abc23XYZfileId")
+    note_id: UUID
+
+class BatchTranscribeRequest(BaseModel):
+    access_token: str = Field(..., example="ya29.a0ARrdaM-example-access-token")
+    items: list[BatchItem] = Field(..., min_length=1, max_length=config.BATCH_MAX_ITEMS)
+    segmented: bool = False
+    summarize: bool = False
+    quality: Literal["auto", "fast", "best"] = "auto"
 
-GOOGLE_DRIVE_DOWNLOAD_URL = "https://www.googleapis.com/drive/v3/files/{file_id}?alt=media"
-GOOGLE_DRIVE_UPLOAD_URL = "https://www.googleapis.com/upload/drive/v3/files/{file_id}?uploadType=media"
-GOOGLE_DRIVE_CREATE_URL = "https://www.googleapis.com/upload/drive/v3/files?uploadType=media"
-GOOGLE_DRIVE_FILE_LIST_URL = (
-    "https://www.googleapis.com/drive/v3/files"
-    "?q=name='notes.json' and trashed=false"
-    "&spaces=appDataFolder"
+TRANSCRIBE_STAGES = ["download", "transcribe", "rephrase", "save"]
+
+
+# Bump whenever the prompts below change so cached Gemini output is not reused
+PROMPT_VERSION = "3"
+
+# Trimming changes what Whisper hears, so its settings are part of the cache key
+TRIM_KEY = (
+    f"trim-{config.TRIM_MIN_SILENCE_SECONDS}-{config.TRIM_KEEP_SECONDS}-{config.SILENCE_THRESHOLD_DB}"
+    if config.TRIM_SILENCE else "trim-off"
 )
 
+FALLBACK_TITLE = "Tidak dapat membuat ringkasan"
+FALLBACK_CONTENT = "Transkripsi tidak tersedia atau tidak dapat diproses."
+
+NOTE_PROMPT = """
+    Anda adalah seorang profesional dalam menyusun teks yang jelas, terstruktur, dan mudah dipahami. Berikut adalah transkrip hasil konversi dari audio yang mungkin mengandung campuran Bahasa Indonesia dan Inggris.
+
+    Tugas Anda:
+    - Merapikan struktur kalimat
+    - Memperbaiki tata bahasa
+    - Menyempurnakan gaya penulisan agar terdengar profesional dan alami
+    - Menentukan satu judul yang paling representatif terhadap isi transkrip
+
+    Jawab dalam JSON dengan field berikut:
+    - title: judul yang singkat, padat, dan relevan dengan isi transkrip
+    - content: transkrip yang sudah dirapikan, berupa satu paragraf panjang, tidak dipisah baris, mengalir alami, dan mudah dipahami, tanpa simbol pemformatan seperti tanda bintang atau garis miring
+    {summary_field}
 
+    Jika transkrip kosong, tidak terbaca, atau tidak dapat diproses, isi title dengan "{fallback_title}" dan content dengan "{fallback_content}"
 
-def rephrase_text_structure_with_gemini(text: str):
-    prompt = """
-        Anda adalah seorang profesional dalam menyusun teks yang jelas, terstruktur, dan mudah dipahami. Berikut adalah transkrip hasil konversi dari audio yang mungkin mengandung campuran Bahasa Indonesia dan Inggris.
+    Berikut transkrip yang perlu diperbaiki dan dirangkum:
+"""
 
-        Tugas Anda:
-        - Merapikan struktur kalimat
-        - Memperbaiki tata bahasa
-        - Menyempurnakan gaya penulisan agar terdengar profesional dan alami
-        - Menentukan satu judul yang paling representatif terhadap isi transkrip
+SUMMARY_FIELD = "- summary: ringkasan isi kuliah, dalam bahasa yang sama dengan transkrip"
 
-        Output HARUS mengikuti format persis berikut (tanpa baris baru, tanpa tanda kutip, tanpa simbol pemformatan seperti tanda bintang, garis miring, tanda petik, atau karakter khusus lainnya):
+CHUNK_CLEANUP_PROMPT = """
+    Anda adalah seorang profesional dalam menyusun teks yang jelas, terstruktur, dan mudah dipahami. Berikut adalah satu bagian dari transkrip kuliah hasil konversi dari audio yang mungkin mengandung campuran Bahasa Indonesia dan Inggris.
 
-        JUDUL:::ISI_TRANSKRIPSI
+    Tugas Anda:
+    - Merapikan struktur kalimat
+    - Memperbaiki tata bahasa
+    - Menyempurnakan gaya penulisan agar terdengar profesional dan alami
+
+    Output HARUS berupa satu paragraf panjang saja, tanpa judul, tanpa baris baru, tanpa tanda kutip, tanpa simbol pemformatan seperti tanda bintang, garis miring, tanda petik, atau karakter khusus lainnya.
+
+    Berikut bagian transkrip yang perlu diperbaiki:
+"""
+
+TITLE_PROMPT = """
+    Jawab dalam JSON dengan field berikut untuk transkrip kuliah di bawah:
+    - title: satu judul yang singkat, padat, dan paling representatif untuk isi transkrip, tanpa simbol pemformatan apa pun
+    {summary_field}
+
+    Transkrip:
+"""
+
+
+def note_schema(fields: list[str]) -> dict:
+    """
+    Gemini response schema: an object with the given string fields, all required.
+    """
+    return {
+        "type": "OBJECT",
+        "properties": {field: {"type": "STRING"} for field in fields},
+        "required": fields,
+    }
+
+
+async def generate_note_fields(prompt: str, text: str, fields: list[str]) -> dict:
+    """
+    One Gemini call returning the requested string fields as structured JSON.
+    Missing or malformed fields come back as None.
+    """
+    response = await generate_content_async(
+        contents=f"{prompt} {text}",
+        response_mime_type="application/json",
+        response_schema=note_schema(fields),
+    )
+    data = parse_json_object(response.text) or {}
+    return {
+        field: clean_text(data[field]).strip() if isinstance(data.get(field), str) and data[field].strip() else None
+        for field in fields
+    }
 
-        Keterangan:
-        - Judul harus singkat, padat, dan relevan dengan isi transkrip.
-        - ISI_TRANSKRIPSI harus berupa satu paragraf panjang, tidak dipisah baris, mengalir alami, dan mudah dipahami.
 
-        Jika transkrip kosong, tidak terbaca, atau tidak dapat diproses, cukup hasilkan teks berikut (tanpa tambahan apa pun):
+async def rephrase_text_structure_with_gemini(text: str, summarize: bool = False) -> dict:
+    """
+    Clean a transcript and pick its title (and write a summary when `summarize`)
+    in a single structured Gemini call.
+    """
+    fields = ["title", "content", "summary"] if summarize else ["title", "content"]
+    prompt = NOTE_PROMPT.format(
+        summary_field=SUMMARY_FIELD if summarize else "",
+        fallback_title=FALLBACK_TITLE,
+        fallback_content=FALLBACK_CONTENT,
+    )
+    try:
+        return await generate_note_fields(prompt, text, fields)
+    except Exception as e:
+        raise to_http_exception(e)
 
-        Tidak dapat membuat ringkasan:::Transkripsi tidak tersedia atau tidak dapat diproses.
 
-        Berikut transkrip yang perlu diperbaiki dan dirangkum:
+async def rephrase_chunked(text: str, summarize: bool = False) -> dict:
     """
+    Cleanup for long transcripts: clean token-bounded chunks concurrently, then
+    pick one title (and write the summary) for the joined result in one call.
+    """
+    async def clean_part(chunk: str):
+        response = await generate_content_async(contents=f"{CHUNK_CLEANUP_PROMPT} {chunk}")
+        return clean_text(response.text).strip()
+
+    fields = ["title", "summary"] if summarize else ["title"]
+    prompt = TITLE_PROMPT.format(summary_field=SUMMARY_FIELD if summarize else "")
     try:
-        response = generate_content(
-            contents=f"{prompt} {text}",
-        )
-        return response.text
+        content = " ".join(await map_chunks(split_text(text), clean_part))
+        return {"content": content, **await generate_note_fields(prompt, content, fields)}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise to_http_exception(e)
 
 # @router.post("/")
 # async def transcribe_audio(file: UploadFile = File(...)):
@@ -91,14 +193,26 @@ def rephrase_text_structure_with_gemini(text: str):
 @router.post(
     "/",
     summary="Transcribe audio from Google Drive",
-    description="Fetches audio using Google Drive file ID and access token, then returns a cleaned transcription.",
+    description="Fetches audio using Google Drive file ID and access token, then returns a cleaned transcription. The `Server-Timing` response header reports how long each stage (download, transcribe, rephrase, save) took. `audio` tells how much silence was cut before Whisper ran (null when the transcript came from the cache). With `summarize: true` the cleaned content, title and a summary come from one structured Gemini call, the summary is stored on the note and returned, so there is no need to call `/summarize` afterwards. `model` is the Whisper model that produced the transcript, also stored on the note as `transcriptionModel`: with the default `quality: \"auto\"` a job may go to a faster model when the queue is long, and posting again with `quality: \"best\"` upgrades the note.",
     responses={
         200: {
             "description": "Successful transcription and cleaning",
             "content": {
                 "application/json": {
                     "example": {
-                        "text": "This lecture discusses reinforcement learning and its applications, such as Q-learning and MDPs."
+                        "success": True,
+                        "message": "Note transcribed successfully.",
+                        "note_id": "3fa85f64-5717-4562-b3fc-2c963f66afa6",
+                        "title": "Reinforcement Learning",
+                        "model": "small",
+                        "summary": "The lecture introduced Markov decision processes and Q-learning.",
+                        "audio": {
+                            "duration_seconds": 5400.0,
+                            "transcribed_seconds": 4212.5,
+                            "removed_fraction": 0.2199,
+                            "whisper_windows_saved": 40,
+                            "estimated_seconds_saved": 475.0
+                        }
                     }
                 }
             }
@@ -119,6 +233,14 @@ def rephrase_text_structure_with_gemini(text: str):
                 }
             }
         },
+        429: {
+            "description": "Too Many Requests - Transcription quota used up or queue too long; retry after `Retry-After` seconds",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Transcription queue is full, please retry later"}
+                }
+            }
+        },
         422: {
             "description": "Validation Error - Missing or invalid input format",
             "content": {
@@ -147,82 +269,508 @@ def rephrase_text_structure_with_gemini(text: str):
 )
 async def transcribe_audio(
     payload: TranscribeRequest,
+    user_data: dict = Depends(get_current_user),
 ):
-    try:
-        headers = {"Authorization": f"Bearer {payload.access_token}"}
+    timer = StageTimer()
+    with scheduler.admit(user_data["uid"]):
+        result = await process_transcription(payload, user_data["uid"], timer)
+    return JSONResponse(content=result, headers={"Server-Timing": timer.header()})
 
-        file_url = GOOGLE_DRIVE_DOWNLOAD_URL.format(file_id=payload.file_id)
 
-        # 1. Download audio from user's Google Drive
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp:
-            input_path = tmp.name
-            response = requests.get(file_url, headers=headers, stream=True)
-            if response.status_code != 200:
-                raise HTTPException(status_code=400, detail="Failed to download audio from Google Drive")
-            for chunk in response.iter_content(chunk_size=8192):
-                tmp.write(chunk)
+@router.post(
+    "/batch",
+    summary="Transcribe several recordings at once",
+    description="Transcribes a list of `(file_id, note_id)` pairs together and writes all note updates to notes.json in a single read-modify-write. Returns a result per item, so one failed recording does not abort the others.",
+    responses={
+        200: {
+            "description": "Per-item results",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "results": [
+                            {"file_id": "1abc23XYZfileId", "note_id": "3fa85f64-5717-4562-b3fc-2c963f66afa6", "success": True, "title": "Reinforcement Learning", "model": "small"},
+                            {"file_id": "1def45XYZfileId", "note_id": "7c9e6679-7425-40de-944b-e07fc1f90ae7", "success": False, "error": {"status_code": 400, "detail": "Failed to download audio from Google Drive"}}
+                        ]
+                    }
+                }
+            }
+        },
+        401: {
+            "description": "Unauthorized - Token verification failed",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Token verification failed"}
+                }
+            }
+        },
+    }
+)
+async def transcribe_batch(
+    payload: BatchTranscribeRequest,
+    user_data: dict = Depends(get_current_user),
+):
+    with scheduler.admit(user_data["uid"], len(payload.items)):
+        return await process_batch(payload, user_data["uid"])
 
-        # 2. Transcribe using Whisper
-        result = model.transcribe(input_path, fp16=False)
-        raw_text = result.get("text", "").strip()
 
-        # 3. Clean using Gemini + utility
-        cleaned_text = clean_text(rephrase_text_structure_with_gemini(raw_text))
-        if ':::' in cleaned_text:
-            title, content = cleaned_text.split(':::', 1)
-        else:
-            title = "Tidak dapat membuat ringkasan"
-            content = "Transkripsi tidak tersedia atau tidak dapat diproses."
-
-        # Step 4: Read current notes.json (if exists)
-        notes = []
-        notes_file_id = None
-        list_resp = requests.get(GOOGLE_DRIVE_FILE_LIST_URL, headers=headers)
-        if list_resp.ok:
-            files = list_resp.json().get("files", [])
-            if files:
-                notes_file_id = files[0]["id"]
-                notes_resp = requests.get(GOOGLE_DRIVE_DOWNLOAD_URL.format(file_id=notes_file_id), headers=headers)
-                if notes_resp.ok:
-                    try:
-                        notes = notes_resp.json()
-                    except Exception:
-                        notes = []
-        
-        # Step 5: Update existing note instead of appending
-        updated_note = None
-        for note in notes:
-            if note.get("id") == str(payload.note_id):
-                note.update({
-                    'title': title,
-                    'isTranscribed': True,
-                    'content': content,
-                    'originalContent': content,
-                })
-                updated_note = note
-                break
-
-        if not updated_note:
+@router.post(
+    "/jobs",
+    status_code=202,
+    summary="Queue a transcription job",
+    description="Runs the same pipeline as `POST /transcribe` in the background and returns a job id right away. The job waits for Whisper in the same fair scheduler as inline requests. Poll `GET /transcribe/jobs/{job_id}` for progress.",
+    responses={
+        202: {
+            "description": "Job accepted",
+            "content": {
+                "application/json": {
+                    "example": {"job_id": "3f2b9c0e8d7a4b6c9e1f0a2b3c4d5e6f", "status": "queued"}
+                }
+            }
+        },
+        401: {
+            "description": "Unauthorized - Token verification failed",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Token verification failed"}
+                }
+            }
+        },
+    }
+)
+async def create_transcription_job(
+    payload: TranscribeRequest,
+    user_data: dict = Depends(get_current_user),
+):
+    reservation = scheduler.admit(user_data["uid"])
+    job = job_runner.submit(user_data["uid"], TRANSCRIBE_STAGES, run_transcription_job, payload, reservation)
+    return {"job_id": job.id, "status": job.status.value}
+
+
+@router.get(
+    "/jobs",
+    summary="List transcription jobs",
+    description="Lists the caller's queued, running and recently finished transcription jobs.",
+)
+async def list_transcription_jobs(user_data: dict = Depends(get_current_user)):
+    return {"jobs": job_runner.list(user_data["uid"])}
+
+
+@router.get(
+    "/jobs/{job_id}",
+    summary="Get transcription job status",
+    description="Returns the job status (queued, running, done or failed), per-stage progress and, once finished, the result or error. Finished jobs are kept for a limited retention period.",
+    responses={
+        200: {
+            "description": "Job status",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "job_id": "3f2b9c0e8d7a4b6c9e1f0a2b3c4d5e6f",
+                        "status": "running",
+                        "stage": "transcribe",
+                        "progress": 0.25,
+                        "stages": [
+                            {"name": "download", "status": "done", "started_at": 1718000000.0, "finished_at": 1718000004.2},
+                            {"name": "transcribe", "status": "running", "started_at": 1718000004.2, "finished_at": None},
+                            {"name": "rephrase", "status": "pending", "started_at": None, "finished_at": None},
+                            {"name": "save", "status": "pending", "started_at": None, "finished_at": None}
+                        ],
+                        "result": None,
+                        "error": None
+                    }
+                }
+            }
+        },
+        404: {
+            "description": "Job not found or expired",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Job not found"}
+                }
+            }
+        },
+    }
+)
+async def get_transcription_job(job_id: str, user_data: dict = Depends(get_current_user)):
+    return job_runner.get(job_id, user_data["uid"])
+
+
+@router.post(
+    "/stream",
+    summary="Transcribe audio with streamed progress",
+    description="Same as `POST /transcribe`, but responds with Server-Sent Events: `segment` events (text plus start/end seconds) as Whisper decodes the audio, or a single `transcript` event when the recording is already in the transcript cache, then a final `done` event with the Gemini-cleaned title and content. Closing the connection cancels the remaining work.",
+    responses={
+        200: {
+            "description": "Event stream",
+            "content": {
+                "text/event-stream": {
+                    "example": (
+                        'event: segment\ndata: {"start": 0.0, "end": 4.2, "text": "Selamat pagi semuanya"}\n\n'
+                        'event: done\ndata: {"note_id": "...", "title": "Reinforcement Learning", "content": "...", "transcriptionModel": "small", "audio": {...}}\n\n'
+                    )
+                }
+            }
+        },
+        401: {
+            "description": "Unauthorized - Token verification failed",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Token verification failed"}
+                }
+            }
+        },
+    }
+)
+async def transcribe_audio_stream(payload: TranscribeRequest, user_data: dict = Depends(get_current_user)):
+    reservation = scheduler.admit(user_data["uid"])
+    return StreamingResponse(
+        stream_transcription(payload, user_data["uid"], reservation),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # Also runs when the client disconnects before the stream starts
+        background=BackgroundTask(reservation.release),
+    )
+
+
+async def trim_audio(audio: DecodedAudio) -> dict:
+    """
+    Cut long pauses out of the decoded audio when `TRIM_SILENCE` is on, and report
+    how much was removed and roughly how much Whisper time that saves.
+    """
+    if config.TRIM_SILENCE:
+        await asyncio.to_thread(audio.trim_silence)
+    removed = audio.original_duration - audio.duration
+    AUDIO_TRIMMED_SECONDS.inc(removed)
+
+    def windows(seconds: float) -> int:
+        return math.ceil(seconds / BATCH_CLIP_SECONDS)
+
+    return {
+        "duration_seconds": round(audio.original_duration, 2),
+        "transcribed_seconds": round(audio.duration, 2),
+        "removed_fraction": round(removed / audio.original_duration, 4) if audio.original_duration else 0.0,
+        "whisper_windows_saved": windows(audio.original_duration) - windows(audio.duration),
+        "estimated_seconds_saved": round(removed * scheduler.realtime_factor, 2),
+    }
+
+
+async def run_transcription_job(job: Job, payload: TranscribeRequest, reservation: Reservation):
+    """
+    The job is queued until the scheduler gives it a Whisper turn, or until a
+    cache hit skips Whisper and it moves on to the cleanup.
+    """
+    def on_stage(name: str):
+        if name == "rephrase":
+            job.start()
+        job.start_stage(name)
+
+    reservation.on_start = job.start
+    with reservation:
+        return await process_transcription(payload, job.user_id, on_stage)
+
+
+async def rephrase_title_content(raw_text: str, summarize: bool = False) -> dict:
+    """
+    Gemini cleanup of a raw transcript: `{"title", "content"}`, plus `"summary"`
+    when `summarize`. Fields Gemini left out fall back to the "not available" text.
+    """
+    if needs_chunking(raw_text):
+        fields = await rephrase_chunked(raw_text, summarize)
+    else:
+        fields = await rephrase_text_structure_with_gemini(raw_text, summarize)
+    fields["title"] = fields["title"] or FALLBACK_TITLE
+    fields["content"] = fields["content"] or FALLBACK_CONTENT
+    if summarize:
+        fields["summary"] = fields["summary"] or FALLBACK_CONTENT
+    return fields
+
+
+def apply_transcription(notes: list, note_id: UUID, fields: dict) -> bool:
+    # Update existing note instead of appending
+    for note in notes:
+        if note.get("id") == str(note_id):
+            note.update({
+                'title': fields["title"],
+                'isTranscribed': True,
+                'content': fields["content"],
+                'originalContent': fields["content"],
+            })
+            if fields.get("summary"):
+                note['summary'] = fields["summary"]
+            if fields.get("transcriptionModel"):
+                note['transcriptionModel'] = fields["transcriptionModel"]
+            return True
+    return False
+
+
+async def save_note(payload: TranscribeRequest, user_id: str, fields: dict):
+    def apply(notes):
+        if not apply_transcription(notes, payload.note_id, fields):
             raise HTTPException(status_code=404, detail="Note not found in notes.json")
 
+    await notes_store.update(user_id, payload.access_token, apply)
 
-        # Step 7: Save updated notes.json
-        update_resp = requests.patch(
-            GOOGLE_DRIVE_UPLOAD_URL.format(file_id=notes_file_id),
-            headers={
-                **headers,
-                "Content-Type": "application/json"
-            },
-            data=json.dumps(notes),
-        )
-        if not update_resp.ok:
-            raise HTTPException(status_code=500, detail="Failed to update notes.json on Google Drive")
 
-        return JSONResponse(content={"success": True, "message": "Note transcribed successfully."})
+async def transcribe_recording(
+    user_id: str,
+    file_id: str,
+    access_token: str,
+    segmented: bool = False,
+    on_stage=None,
+    lookup_md5: bool = True,
+    summarize: bool = False,
+    quality: str = "auto",
+):
+    """
+    Download, transcribe and clean one recording, returning the note fields from
+    `rephrase_title_content` (plus the `transcriptionModel` used) and a report.
+    With `lookup_md5`, Drive's checksum is fetched first so a cache hit skips the download.
+    Whisper runs when the scheduler gives this user a turn, charged by audio duration.
+    The report comes from `trim_audio`, or is None when Whisper was skipped.
+    Finished Whisper chunks are checkpointed until the transcript is cached, so a
+    retry after a crash or restart resumes from the last one. The model tier is
+    picked by `model_policy` from `quality` and the expected wait.
+    """
+    on_stage = StageObserver("transcribe", on_stage)
+    audio = None
+    report = None
+    try:
+        note_kind = "summary" if summarize else "note"
+        acceptable = model_policy.acceptable(quality)
+        model, cached, raw_text = None, None, None
 
-    except Exception as e:
-        raise e
+        # 1. Download audio from user's Google Drive, unless the cache already has this recording
+        on_stage("download")
+        audio_hash = await drive.get_md5(file_id, access_token) if lookup_md5 else None
+        if audio_hash:
+            model, cached, raw_text = find_cached(audio_hash, acceptable, note_kind)
+        if not cached and raw_text is None:
+            audio = await drive.download_pcm(file_id, access_token)
+            if not audio_hash:
+                audio_hash = audio.md5
+                model, cached, raw_text = find_cached(audio_hash, acceptable, note_kind)
+
+        # 2. Transcribe using Whisper (in the inference worker pool)
+        on_stage("transcribe")
+        if not cached and raw_text is None:
+            report = await trim_audio(audio)
+            model = choose_model(user_id, audio, quality)
+            model_key = inference_pool.model_key(model)
+            checkpoint = checkpoint_store.open(audio_hash, model_key, TRIM_KEY)
+            width = segment_width(audio) if segmented else 1
+            async with scheduler.slot(user_id, audio.duration, model_policy.work_factor(model), width):
+                if segmented:
+                    result = await inference_pool.transcribe_segmented(audio.pcm, checkpoint, model, fp16=False)
+                elif checkpoint and audio.duration > config.CHECKPOINT_MIN_SECONDS:
+                    result = await inference_pool.transcribe_resumable(audio.pcm, checkpoint, model, fp16=False)
+                else:
+                    result = await inference_pool.transcribe(audio.for_worker(), model, fp16=False)
+            AUDIO_SECONDS.inc(audio.duration)
+            raw_text = result.get("text", "").strip()
+            transcript_cache.put("transcript", raw_text, audio_hash, model_key, TRIM_KEY)
+            if checkpoint:
+                checkpoint.clear()
+
+        # 3. Clean using Gemini + utility
+        on_stage("rephrase")
+        if cached:
+            return {**cached, "transcriptionModel": model}, report
+        fields = await rephrase_title_content(raw_text, summarize)
+        transcript_cache.put("rephrase", fields, audio_hash, inference_pool.model_key(model), TRIM_KEY, note_kind, PROMPT_VERSION)
+        return {**fields, "transcriptionModel": model}, report
+
+    except Exception:
+        on_stage.fail()
+        raise
     finally:
-        os.remove(input_path)
-    
-    return JSONResponse(content={"message": "Note updated successfully.", "note_id": str(payload.note_id)})
\ No newline at end of file
+        on_stage.finish()
+        if audio:
+            audio.close()
+
+
+def find_cached(audio_hash: str, models: list[str], note_kind: str):
+    """
+    The first of `models` (best first) with a cached cleanup or raw transcript of
+    this recording, as `(model, cleanup, transcript)`.
+    """
+    for model in models:
+        model_key = inference_pool.model_key(model)
+        cached = transcript_cache.get("rephrase", audio_hash, model_key, TRIM_KEY, note_kind, PROMPT_VERSION)
+        raw_text = transcript_cache.get("transcript", audio_hash, model_key, TRIM_KEY)
+        if cached or raw_text is not None:
+            return model, cached, raw_text
+    return None, None, None
+
+
+def segment_width(audio: DecodedAudio) -> int:
+    """
+    Workers a segmented or streamed transcription keeps busy at once.
+    """
+    return max(1, min(inference_pool.size, math.ceil(audio.duration / config.SEGMENT_MAX_SECONDS)))
+
+
+def choose_model(user_id: str, audio: DecodedAudio, quality: str) -> str:
+    # The request's own placeholder is about to become this job, so it isn't waited on
+    reservation = current_reservation.get()
+    admitted = bool(reservation and reservation.jobs and reservation.user_id == user_id)
+    expected = scheduler.estimated_wait(user_id, admitted) + audio.duration * scheduler.realtime_factor
+    return model_policy.choose(quality, expected)
+
+
+async def process_transcription(payload: TranscribeRequest, user_id: str, on_stage=None):
+    on_stage = on_stage or (lambda stage: None)
+    fields, report = await transcribe_recording(
+        user_id, payload.file_id, payload.access_token, payload.segmented, on_stage,
+        summarize=payload.summarize, quality=payload.quality,
+    )
+
+    # 4. Write the note back to notes.json
+    on_stage("save")
+    with observe_stage("transcribe", "save"):
+        await save_note(payload, user_id, fields)
+
+    result = {
+        "success": True,
+        "message": "Note transcribed successfully.",
+        "note_id": str(payload.note_id),
+        "title": fields["title"],
+        "model": fields["transcriptionModel"],
+    }
+    if payload.summarize:
+        result["summary"] = fields["summary"]
+    result["audio"] = report
+    return result
+
+
+async def process_batch(payload: BatchTranscribeRequest, user_id: str):
+    """
+    Transcribe every item, then apply all note updates in one notes.json read-modify-write.
+    Skipping the per-item checksum lookup keeps Drive round trips to about N + 2.
+    """
+    semaphore = asyncio.Semaphore(max(1, inference_pool.size))
+
+    async def run(item: BatchItem):
+        async with semaphore:
+            return await transcribe_recording(
+                user_id, item.file_id, payload.access_token, payload.segmented, lookup_md5=False,
+                summarize=payload.summarize, quality=payload.quality,
+            )
+
+    outcomes = await asyncio.gather(*[run(item) for item in payload.items], return_exceptions=True)
+    results = [{"file_id": item.file_id, "note_id": str(item.note_id)} for item in payload.items]
+    for result, outcome in zip(results, outcomes):
+        if isinstance(outcome, HTTPException):
+            result.update({"success": False, "error": {"status_code": outcome.status_code, "detail": outcome.detail}})
+        elif isinstance(outcome, Exception):
+            result.update({"success": False, "error": {"status_code": 500, "detail": str(outcome)}})
+        else:
+            result.update({"success": True, "title": outcome[0]["title"], "model": outcome[0]["transcriptionModel"], "audio": outcome[1]})
+
+    transcribed = [(item, outcome) for item, outcome in zip(payload.items, outcomes) if not isinstance(outcome, BaseException)]
+    if not transcribed:
+        return {"results": results}
+
+    missing = set()
+
+    def apply(notes):
+        missing.clear()
+        for item, (fields, _) in transcribed:
+            if not apply_transcription(notes, item.note_id, fields):
+                missing.add(str(item.note_id))
+
+    try:
+        with observe_stage("batch", "save"):
+            await notes_store.update(user_id, payload.access_token, apply)
+        error = None
+    except HTTPException as e:
+        error = {"status_code": e.status_code, "detail": e.detail}
+
+    for result in results:
+        if not result["success"]:
+            continue
+        if error or result["note_id"] in missing:
+            for key in ("title", "model", "audio"):
+                result.pop(key)
+        if error:
+            result.update({"success": False, "error": error})
+        elif result["note_id"] in missing:
+            result.update({"success": False, "error": {"status_code": 404, "detail": "Note not found in notes.json"}})
+    return {"results": results}
+
+
+async def stream_transcription(payload: TranscribeRequest, user_id: str, reservation: Reservation):
+    """
+    Same pipeline as `process_transcription`, but yields Server-Sent Events: Whisper
+    segments as each chunk is decoded, then the Gemini-cleaned title and content.
+    A recording already in the transcript cache is sent as one `transcript` event.
+    If the client disconnects, the generator is closed and queued chunks are cancelled.
+    """
+    audio = None
+    report = None
+    stages = StageObserver("transcribe_stream")
+    with reservation:
+        try:
+            note_kind = "summary" if payload.summarize else "note"
+            acceptable = model_policy.acceptable(payload.quality)
+            model, cached, raw_text = None, None, None
+
+            stages("download")
+            yield sse_event("stage", {"stage": "download"})
+            audio_hash = await drive.get_md5(payload.file_id, payload.access_token)
+            if audio_hash:
+                model, cached, raw_text = find_cached(audio_hash, acceptable, note_kind)
+            if not cached and raw_text is None:
+                audio = await drive.download_pcm(payload.file_id, payload.access_token)
+                if not audio_hash:
+                    audio_hash = audio.md5
+                    model, cached, raw_text = find_cached(audio_hash, acceptable, note_kind)
+
+            stages("transcribe")
+            yield sse_event("stage", {"stage": "transcribe"})
+            if cached or raw_text is not None:
+                yield sse_event("transcript", {"text": raw_text if raw_text is not None else cached["content"]})
+            else:
+                report = await trim_audio(audio)
+                model = choose_model(user_id, audio, payload.quality)
+                model_key = inference_pool.model_key(model)
+                checkpoint = checkpoint_store.open(audio_hash, model_key, TRIM_KEY)
+                texts = []
+                async with scheduler.slot(user_id, audio.duration, model_policy.work_factor(model), segment_width(audio)):
+                    async for (start, _), result in inference_pool.stream_segmented(audio.pcm, checkpoint, model, fp16=False):
+                        offset = start / SAMPLE_RATE
+                        for segment in result.get("segments", []):
+                            yield sse_event("segment", {
+                                "start": audio.original_time(segment["start"] + offset),
+                                "end": audio.original_time(segment["end"] + offset),
+                                "text": segment["text"].strip(),
+                            })
+                        texts.append(result.get("text", "").strip())
+                raw_text = " ".join(text for text in texts if text)
+                AUDIO_SECONDS.inc(audio.duration)
+                transcript_cache.put("transcript", raw_text, audio_hash, model_key, TRIM_KEY)
+                if checkpoint:
+                    checkpoint.clear()
+
+            stages("rephrase")
+            yield sse_event("stage", {"stage": "rephrase"})
+            if not cached:
+                cached = await rephrase_title_content(raw_text, payload.summarize)
+                transcript_cache.put("rephrase", cached, audio_hash, inference_pool.model_key(model), TRIM_KEY, note_kind, PROMPT_VERSION)
+            fields = {**cached, "transcriptionModel": model}
+
+            stages("save")
+            yield sse_event("stage", {"stage": "save"})
+            await save_note(payload, user_id, fields)
+
+            yield sse_event("done", {"note_id": str(payload.note_id), **fields, "audio": report})
+
+        except HTTPException as e:
+            stages.fail()
+            yield sse_event("error", {"status_code": e.status_code, "detail": e.detail})
+        except Exception as e:
+            stages.fail()
+            yield sse_event("error", {"status_code": 500, "detail": str(e)})
+        finally:
+            stages.finish()
+            if audio:
+                audio.close()
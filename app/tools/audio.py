@@ -0,0 +1,392 @@
+import asyncio
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from contextlib import contextmanager
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+from fastapi import HTTPException
+
+from app import config
+
+
+SAMPLE_RATE = 16000
+FFMPEG_OUTPUT_ARGS = ["-f", "f32le", "-ac", "1", "-ar", str(SAMPLE_RATE), "pipe:1"]
+# Samples handled at a time when scanning or copying audio that may be memory-mapped
+BLOCK_SAMPLES = 60 * SAMPLE_RATE
+
+
+# sudo apt update && sudo apt install ffmpeg
+def load_pcm(input_path: str) -> np.ndarray:
+    """
+    Decode any audio file to 16 kHz mono float32 PCM using FFmpeg.
+    """
+    out = subprocess.run(
+        [
+            "ffmpeg", "-nostdin", "-threads", "0", "-i", input_path,
+            "-f", "f32le", "-ac", "1", "-ar", str(SAMPLE_RATE), "-",
+        ],
+        capture_output=True,
+        check=True,
+    ).stdout
+    return np.frombuffer(out, np.float32)
+
+
+class PcmFile:
+    """
+    Picklable reference to raw float32 PCM on disk, so worker processes can read
+    large recordings themselves instead of receiving them through a pipe.
+    """
+
+    def __init__(self, path: str, length: int):
+        self.path = path
+        self.length = length
+
+    def load(self) -> np.ndarray:
+        return np.fromfile(self.path, np.float32, count=self.length)
+
+
+class SharedPcm:
+    """
+    Picklable reference to float32 PCM in a shared memory block, so another
+    process can read the audio without it being serialized. The block belongs
+    to whoever created it with `shared_pcm`; readers only attach.
+    """
+
+    def __init__(self, name: str, length: int):
+        self.name = name
+        self.length = length
+
+    def load(self) -> np.ndarray:
+        if sys.version_info >= (3, 13):
+            shm = shared_memory.SharedMemory(self.name, track=False)
+        else:
+            shm = shared_memory.SharedMemory(self.name)
+            # Otherwise this process's resource tracker would unlink the owner's block when it exits
+            resource_tracker.unregister(shm._name, "shared_memory")
+        try:
+            view = np.ndarray((self.length,), np.float32, buffer=shm.buf)
+            pcm = view.copy()
+            del view
+            return pcm
+        finally:
+            shm.close()
+
+
+@contextmanager
+def shared_pcm(pcm: np.ndarray):
+    """
+    Copy PCM into a new shared memory block for the duration of the block.
+    """
+    shm = shared_memory.SharedMemory(create=True, size=max(1, pcm.nbytes))
+    try:
+        view = np.ndarray((len(pcm),), np.float32, buffer=shm.buf)
+        view[:] = pcm
+        del view
+        yield SharedPcm(shm.name, len(pcm))
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+class OffsetMap:
+    """
+    Maps times in trimmed audio back to the original recording, given the
+    (start, end) sample ranges of the original that were kept, in order.
+    """
+
+    def __init__(self, kept: list[tuple[int, int]]):
+        self.starts = np.array([start for start, _ in kept], dtype=np.int64)
+        lengths = np.array([end - start for start, end in kept], dtype=np.int64)
+        self.trimmed_starts = np.concatenate(([0], np.cumsum(lengths)[:-1])).astype(np.int64)
+
+    def to_original(self, seconds: float) -> float:
+        if len(self.starts) == 0:
+            return seconds
+        sample = seconds * SAMPLE_RATE
+        i = max(0, int(np.searchsorted(self.trimmed_starts, sample, side="right")) - 1)
+        return float(self.starts[i] + sample - self.trimmed_starts[i]) / SAMPLE_RATE
+
+
+class DecodedAudio:
+    def __init__(self, pcm: np.ndarray, md5: str, path: str | None = None):
+        self.pcm = pcm
+        self.md5 = md5
+        self.path = path
+        self.original_samples = len(pcm)
+        self.offsets = None
+
+    @property
+    def duration(self) -> float:
+        return len(self.pcm) / SAMPLE_RATE
+
+    @property
+    def original_duration(self) -> float:
+        return self.original_samples / SAMPLE_RATE
+
+    def original_time(self, seconds: float) -> float:
+        """
+        Position in the original recording of `seconds` into the (possibly trimmed) PCM.
+        """
+        return self.offsets.to_original(seconds) if self.offsets else seconds
+
+    def trim_silence(self, **options):
+        """
+        Shorten long pauses in place (see `speech_ranges`) and keep the offset map
+        so timestamps can still be reported against the original recording.
+        """
+        kept = speech_ranges(self.pcm, **options)
+        if not kept or kept == [(0, len(self.pcm))]:
+            return
+        self.offsets = OffsetMap(kept)
+        if not self.path:
+            self.pcm = np.concatenate([self.pcm[start:end] for start, end in kept])
+            return
+        # Spilled recordings stay on disk: copy the kept ranges to a new file
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".f32") as f:
+            for start, end in kept:
+                for block in range(start, end, BLOCK_SAMPLES):
+                    f.write(self.pcm[block:min(block + BLOCK_SAMPLES, end)].tobytes())
+        length = sum(end - start for start, end in kept)
+        self.close()
+        self.pcm = np.memmap(f.name, np.float32, mode="r", shape=(length,))
+        self.path = f.name
+
+    def for_worker(self):
+        return PcmFile(self.path, len(self.pcm)) if self.path else self.pcm
+
+    def close(self):
+        if self.path:
+            self.pcm = None
+            os.remove(self.path)
+            self.path = None
+
+
+class PcmBuffer:
+    """
+    Collects decoder output in memory, spilling to a temp file past `limit` bytes.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.buffer = bytearray()
+        self.size = 0
+        self.file = None
+
+    def write(self, data: bytes):
+        self.size += len(data)
+        if self.file is None and self.size > self.limit:
+            self.file = tempfile.NamedTemporaryFile(delete=False, suffix=".f32")
+            self.file.write(self.buffer)
+            self.buffer = bytearray()
+        if self.file:
+            self.file.write(data)
+        else:
+            self.buffer += data
+
+    def finish(self) -> tuple[np.ndarray, str | None]:
+        if not self.file:
+            return np.frombuffer(self.buffer, np.float32), None
+        self.file.close()
+        length = self.size // 4
+        if length == 0:
+            os.remove(self.file.name)
+            return np.empty(0, np.float32), None
+        return np.memmap(self.file.name, np.float32, mode="r", shape=(length,)), self.file.name
+
+    def discard(self):
+        if self.file:
+            self.file.close()
+            os.remove(self.file.name)
+            self.file = None
+        self.buffer = bytearray()
+
+
+async def _run_ffmpeg(input_args: list[str], feed=None, memory_limit: int = config.AUDIO_MEMORY_LIMIT_BYTES):
+    """
+    Run ffmpeg to 16 kHz mono float32 PCM. `feed(stdin)`, when given, writes the input.
+    """
+    process = await asyncio.create_subprocess_exec(
+        "ffmpeg", "-hide_banner", "-loglevel", "error", "-threads", "0",
+        *input_args, *FFMPEG_OUTPUT_ARGS,
+        stdin=asyncio.subprocess.PIPE if feed else asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    buffer = PcmBuffer(memory_limit)
+
+    async def read_stdout():
+        while chunk := await process.stdout.read(1024 * 1024):
+            buffer.write(chunk)
+
+    try:
+        tasks = [read_stdout(), process.stderr.read()]
+        if feed:
+            tasks.append(feed(process.stdin))
+        _, stderr, *_ = await asyncio.gather(*tasks)
+        returncode = await process.wait()
+    except BaseException:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        buffer.discard()
+        raise
+    return returncode, buffer, stderr
+
+
+def _decode_failed(returncode: int, buffer: PcmBuffer, stderr: bytes) -> bool:
+    # ffmpeg exits 0 on a truncated MP4 read from a pipe, so also check what it said
+    return returncode != 0 or buffer.size == 0 or b"partial file" in stderr or b"moov atom not found" in stderr
+
+
+async def decode_stream(chunks, memory_limit: int = config.AUDIO_MEMORY_LIMIT_BYTES) -> DecodedAudio:
+    """
+    Pipe an async iterator of encoded audio bytes straight into ffmpeg and collect
+    16 kHz mono float32 PCM, hashing the input bytes on the way.
+
+    Decoded audio stays in memory unless it grows past `memory_limit` bytes. The
+    encoded input is also kept (spooled to disk past the same limit) because
+    containers with their index at the end, such as some M4A recordings, cannot be
+    decoded from a pipe; those are decoded again from a temp file.
+    """
+    md5 = hashlib.md5()
+    source = tempfile.SpooledTemporaryFile(max_size=memory_limit)
+
+    async def feed(stdin):
+        try:
+            async for chunk in chunks:
+                md5.update(chunk)
+                source.write(chunk)
+                if stdin is None:
+                    continue
+                try:
+                    stdin.write(chunk)
+                    await stdin.drain()
+                except (BrokenPipeError, ConnectionResetError):
+                    # ffmpeg gave up on the pipe; keep reading so we can retry from a file
+                    stdin = None
+        finally:
+            if stdin is not None:
+                stdin.close()
+
+    try:
+        returncode, buffer, stderr = await _run_ffmpeg(["-i", "pipe:0"], feed, memory_limit)
+        if _decode_failed(returncode, buffer, stderr):
+            buffer.discard()
+            with tempfile.NamedTemporaryFile(delete=False) as tmp:
+                source.seek(0)
+                shutil.copyfileobj(source, tmp)
+            try:
+                returncode, buffer, stderr = await _run_ffmpeg(["-i", tmp.name], memory_limit=memory_limit)
+            finally:
+                os.remove(tmp.name)
+            if returncode != 0:
+                buffer.discard()
+                raise HTTPException(status_code=400, detail="Failed to decode audio")
+    finally:
+        source.close()
+
+    pcm, path = buffer.finish()
+    return DecodedAudio(pcm, md5.hexdigest(), path)
+
+
+def frame_energy_db(pcm: np.ndarray, frame_ms: int = 30) -> np.ndarray:
+    """
+    RMS energy of consecutive non-overlapping frames, in dB. Works through the
+    audio in blocks, so a spilled (memory-mapped) recording is never copied
+    into memory whole.
+    """
+    frame = SAMPLE_RATE * frame_ms // 1000
+    n_frames = len(pcm) // frame
+    block_frames = max(1, BLOCK_SAMPLES // frame)
+    rms = np.empty(n_frames, np.float32)
+    for first in range(0, n_frames, block_frames):
+        last = min(first + block_frames, n_frames)
+        frames = np.asarray(pcm[first * frame:last * frame]).reshape(last - first, frame)
+        rms[first:last] = np.sqrt(np.mean(np.square(frames, dtype=np.float32), axis=1))
+    return 20 * np.log10(np.maximum(rms, 1e-10))
+
+
+def find_silences(
+    pcm: np.ndarray,
+    frame_ms: int = 30,
+    threshold_db: float = -35.0,
+    min_silence_seconds: float = 0.5,
+) -> list[tuple[int, int]]:
+    """
+    Return (start, end) sample ranges of silence.
+
+    A frame is silent when its energy is `threshold_db` below the loud (95th
+    percentile) level of the recording, so the threshold follows the gain of
+    each recording instead of being absolute.
+    """
+    energy = frame_energy_db(pcm, frame_ms)
+    if len(energy) == 0:
+        return []
+    silent = energy < np.percentile(energy, 95) + threshold_db
+
+    # Run boundaries of consecutive silent frames
+    padded = np.concatenate(([False], silent, [False]))
+    edges = np.flatnonzero(np.diff(padded.astype(np.int8)))
+    starts, ends = edges[::2], edges[1::2]
+
+    frame = SAMPLE_RATE * frame_ms // 1000
+    min_frames = int(min_silence_seconds * 1000 / frame_ms)
+    return [(int(s) * frame, int(e) * frame) for s, e in zip(starts, ends) if e - s >= min_frames]
+
+
+def speech_ranges(
+    pcm: np.ndarray,
+    min_silence_seconds: float = config.TRIM_MIN_SILENCE_SECONDS,
+    keep_seconds: float = config.TRIM_KEEP_SECONDS,
+    threshold_db: float = config.SILENCE_THRESHOLD_DB,
+) -> list[tuple[int, int]]:
+    """
+    Return the (start, end) sample ranges to keep when every silence of at least
+    `min_silence_seconds` is cut down to `keep_seconds`. Half of the kept pause
+    stays at each edge so quiet word onsets and endings are not clipped.
+    """
+    edge = int(keep_seconds * SAMPLE_RATE) // 2
+    kept = []
+    start = 0
+    for silence_start, silence_end in find_silences(pcm, threshold_db=threshold_db, min_silence_seconds=min_silence_seconds):
+        if silence_end - silence_start <= 2 * edge:
+            continue
+        kept.append((start, silence_start + edge))
+        start = silence_end - edge
+    kept.append((start, len(pcm)))
+    return [(start, end) for start, end in kept if end > start]
+
+
+def split_on_silence(
+    pcm: np.ndarray,
+    max_chunk_seconds: float = 120.0,
+    min_chunk_seconds: float = 30.0,
+    **silence_options,
+) -> list[tuple[int, int]]:
+    """
+    Cut the audio into (start, end) sample ranges no longer than `max_chunk_seconds`.
+    Cuts are placed in the middle of the last silence that fits, falling back to a
+    hard cut when a long stretch has no pause at all.
+    """
+    total = len(pcm)
+    max_len = int(max_chunk_seconds * SAMPLE_RATE)
+    min_len = int(min_chunk_seconds * SAMPLE_RATE)
+    if total <= max_len:
+        return [(0, total)]
+
+    cut_points = [(s + e) // 2 for s, e in find_silences(pcm, **silence_options)]
+    chunks = []
+    start = 0
+    while total - start > max_len:
+        candidates = [c for c in cut_points if start + min_len <= c <= start + max_len]
+        end = candidates[-1] if candidates else start + max_len
+        chunks.append((start, end))
+        start = end
+    chunks.append((start, total))
+    return chunks
@@ -0,0 +1,101 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from app import config
+
+
+class CheckpointStore:
+    """
+    Finished Whisper chunks in a local SQLite database, so a recording that is
+    transcribed again after a crash, restart or client retry skips the chunks
+    that were already done. Rows are keyed by recording (audio hash plus
+    everything that changes Whisper's output) and chunk sample range.
+    """
+
+    def __init__(self, path: str = config.CHECKPOINT_DB, retention_seconds: int = config.CHECKPOINT_RETENTION_SECONDS):
+        self.path = path
+        self.retention_seconds = retention_seconds
+        self._conn = None
+        self._lock = threading.Lock()
+        self.resumed = 0
+        self.saved = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunks ("
+                " recording TEXT NOT NULL, start INTEGER NOT NULL, end INTEGER NOT NULL,"
+                " result TEXT NOT NULL, created REAL NOT NULL,"
+                " PRIMARY KEY (recording, start, end))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS chunks_created ON chunks (created)")
+            conn.execute("DELETE FROM chunks WHERE created < ?", (time.time() - self.retention_seconds,))
+            self._conn = conn
+        return self._conn
+
+    def open(self, *parts) -> "Checkpoint | None":
+        """
+        Checkpoints of one recording, or None when checkpointing is disabled.
+        """
+        if not self.enabled:
+            return None
+        recording = "\0".join(str(part) for part in parts)
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT start, end, result FROM chunks WHERE recording = ?", (recording,)
+            ).fetchall()
+        done = {(start, end): json.loads(result) for start, end, result in rows}
+        self.resumed += len(done)
+        return Checkpoint(self, recording, done)
+
+    def save(self, recording: str, chunk: tuple[int, int], result: dict):
+        with self._lock:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?, ?)",
+                (recording, chunk[0], chunk[1], json.dumps(result, ensure_ascii=False), time.time()),
+            )
+        self.saved += 1
+
+    def clear(self, recording: str):
+        with self._lock:
+            self._connect().execute("DELETE FROM chunks WHERE recording = ?", (recording,))
+
+    def stats(self):
+        return {"enabled": self.enabled, "resumed_chunks": self.resumed, "saved_chunks": self.saved}
+
+
+class Checkpoint:
+    def __init__(self, store: CheckpointStore, recording: str, done: dict):
+        self.store = store
+        self.recording = recording
+        self.done = done
+
+    def get(self, chunk: tuple[int, int]) -> dict | None:
+        return self.done.get(tuple(chunk))
+
+    def put(self, chunk: tuple[int, int], result: dict):
+        self.done[tuple(chunk)] = result
+        self.store.save(self.recording, chunk, result)
+
+    def clear(self):
+        """
+        Drop the rows once the whole transcript is stored elsewhere.
+        """
+        self.done = {}
+        self.store.clear(self.recording)
+
+
+checkpoint_store = CheckpointStore()
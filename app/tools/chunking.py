@@ -0,0 +1,78 @@
+import asyncio
+import math
+import re
+
+from app import config
+
+
+PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token estimate from character count, good enough for sizing prompts.
+    """
+    return math.ceil(len(text) / config.CHARS_PER_TOKEN)
+
+
+def _pieces(text: str, max_chars: int):
+    """
+    Yield `(piece, separator)` pairs: paragraphs when they fit, otherwise sentences,
+    otherwise whitespace-bounded slices of an overlong sentence.
+    """
+    for paragraph in PARAGRAPH_BREAK.split(text.strip()):
+        if len(paragraph) <= max_chars:
+            yield paragraph, "\n\n"
+            continue
+        for sentence in SENTENCE_END.split(paragraph):
+            while len(sentence) > max_chars:
+                cut = sentence.rfind(" ", 0, max_chars)
+                cut = cut if cut > 0 else max_chars
+                yield sentence[:cut], " "
+                sentence = sentence[cut:].lstrip()
+            if sentence:
+                yield sentence, " "
+        yield "", "\n\n"
+
+
+def split_text(text: str, max_tokens: int = config.CHUNK_TOKENS, max_chunks: int = config.MAX_CHUNKS) -> list[str]:
+    """
+    Split text on paragraph and sentence boundaries into chunks of at most
+    `max_tokens` (estimated), growing the chunk size if that would need more
+    than `max_chunks` chunks.
+    """
+    max_tokens = max(max_tokens, math.ceil(estimate_tokens(text) / max_chunks))
+    max_chars = max_tokens * config.CHARS_PER_TOKEN
+
+    chunks, current, pending_sep = [], "", ""
+    for piece, sep in _pieces(text, max_chars):
+        if not piece:
+            pending_sep = sep if current else ""
+            continue
+        if current and len(current) + len(pending_sep) + len(piece) > max_chars:
+            chunks.append(current)
+            current = piece
+        else:
+            current = f"{current}{pending_sep}{piece}" if current else piece
+        pending_sep = sep
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def needs_chunking(text: str) -> bool:
+    return estimate_tokens(text) > config.CHUNKED_THRESHOLD_TOKENS
+
+
+async def map_chunks(chunks: list[str], func, fanout: int = config.CHUNK_FANOUT) -> list:
+    """
+    Run `await func(chunk)` for every chunk with at most `fanout` in flight, keeping order.
+    """
+    semaphore = asyncio.Semaphore(fanout)
+
+    async def run(chunk):
+        async with semaphore:
+            return await func(chunk)
+
+    return await asyncio.gather(*[run(chunk) for chunk in chunks])
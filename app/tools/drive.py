@@ -0,0 +1,164 @@
+import asyncio
+import json
+import random
+
+from contextlib import asynccontextmanager
+
+import httpx
+from fastapi import HTTPException
+
+from app import config
+from app.tools.audio import DecodedAudio, decode_stream
+from app.tools.metrics import DRIVE_DOWNLOAD_BYTES
+
+
+GOOGLE_DRIVE_METADATA_URL = config.DRIVE_API_URL + "/drive/v3/files/{file_id}?fields=md5Checksum,size"
+GOOGLE_DRIVE_VERSION_URL = config.DRIVE_API_URL + "/drive/v3/files/{file_id}?fields=version"
+GOOGLE_DRIVE_DOWNLOAD_URL = config.DRIVE_API_URL + "/drive/v3/files/{file_id}?alt=media"
+GOOGLE_DRIVE_UPLOAD_URL = config.DRIVE_API_URL + "/upload/drive/v3/files/{file_id}?uploadType=media&fields=id,version"
+GOOGLE_DRIVE_CREATE_URL = config.DRIVE_API_URL + "/upload/drive/v3/files?uploadType=media"
+GOOGLE_DRIVE_FILE_LIST_URL = (
+    config.DRIVE_API_URL + "/drive/v3/files"
+    "?q=name='notes.json' and trashed=false"
+    "&spaces=appDataFolder"
+    "&fields=files(id,version)"
+)
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+def auth_headers(access_token: str) -> dict:
+    return {"Authorization": f"Bearer {access_token}"}
+
+
+class DriveClient:
+    """
+    Shared async HTTP client for Google Drive with keep-alive pooling, HTTP/2 when
+    the `h2` package is installed, and retries with backoff on 429/5xx responses.
+    """
+
+    def __init__(self):
+        self.client: httpx.AsyncClient | None = None
+
+    def start(self):
+        if self.client:
+            return
+        self.client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            timeout=httpx.Timeout(config.DRIVE_TIMEOUT_SECONDS, connect=config.DRIVE_CONNECT_TIMEOUT_SECONDS),
+            limits=httpx.Limits(
+                max_connections=config.DRIVE_MAX_CONNECTIONS,
+                max_keepalive_connections=config.DRIVE_MAX_CONNECTIONS,
+                keepalive_expiry=60,
+            ),
+        )
+
+    async def close(self):
+        if self.client:
+            await self.client.aclose()
+            self.client = None
+
+    def _backoff(self, attempt: int, response: httpx.Response | None = None) -> float:
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), config.DRIVE_MAX_BACKOFF_SECONDS)
+        delay = min(config.DRIVE_BACKOFF_SECONDS * 2 ** attempt, config.DRIVE_MAX_BACKOFF_SECONDS)
+        return random.uniform(0, delay)
+
+    async def send(self, method: str, url: str, stream: bool = False, **kwargs) -> httpx.Response:
+        self.start()
+        request = self.client.build_request(method, url, **kwargs)
+        for attempt in range(config.DRIVE_MAX_RETRIES + 1):
+            try:
+                response = await self.client.send(request, stream=stream)
+            except httpx.TransportError:
+                if attempt == config.DRIVE_MAX_RETRIES:
+                    raise
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+            if response.status_code not in RETRY_STATUS_CODES or attempt == config.DRIVE_MAX_RETRIES:
+                return response
+            await response.aclose()
+            await asyncio.sleep(self._backoff(attempt, response))
+
+    @asynccontextmanager
+    async def stream(self, method: str, url: str, **kwargs):
+        response = await self.send(method, url, stream=True, **kwargs)
+        try:
+            yield response
+        finally:
+            await response.aclose()
+
+    async def get_md5(self, file_id: str, access_token: str):
+        """
+        Drive's md5Checksum for the file, or None when Drive doesn't provide one.
+        """
+        try:
+            response = await self.send("GET", GOOGLE_DRIVE_METADATA_URL.format(file_id=file_id), headers=auth_headers(access_token))
+            if response.is_success:
+                return response.json().get("md5Checksum")
+        except (httpx.HTTPError, ValueError):
+            pass
+        return None
+
+    async def download_pcm(self, file_id: str, access_token: str) -> DecodedAudio:
+        """
+        Stream the Drive file through ffmpeg into 16 kHz mono PCM without a temp file.
+        """
+        url = GOOGLE_DRIVE_DOWNLOAD_URL.format(file_id=file_id)
+        async with self.stream("GET", url, headers=auth_headers(access_token)) as response:
+            if response.status_code != 200:
+                raise HTTPException(status_code=400, detail="Failed to download audio from Google Drive")
+            return await decode_stream(self._count_bytes(response.aiter_bytes(1024 * 1024)))
+
+    @staticmethod
+    async def _count_bytes(chunks):
+        async for chunk in chunks:
+            DRIVE_DOWNLOAD_BYTES.inc(len(chunk))
+            yield chunk
+
+    async def get_version(self, file_id: str, access_token: str):
+        """
+        Drive's monotonically increasing `version` of the file, or None if it can't be read.
+        """
+        response = await self.send("GET", GOOGLE_DRIVE_VERSION_URL.format(file_id=file_id), headers=auth_headers(access_token))
+        if not response.is_success:
+            return None
+        return response.json().get("version")
+
+    async def find_notes_file(self, access_token: str):
+        """
+        `{"id", "version"}` of notes.json in the user's appDataFolder, or None if it doesn't exist.
+        """
+        response = await self.send("GET", GOOGLE_DRIVE_FILE_LIST_URL, headers=auth_headers(access_token))
+        if not response.is_success:
+            return None
+        files = response.json().get("files", [])
+        return files[0] if files else None
+
+    async def read_json(self, file_id: str, access_token: str, default=None):
+        response = await self.send("GET", GOOGLE_DRIVE_DOWNLOAD_URL.format(file_id=file_id), headers=auth_headers(access_token))
+        if not response.is_success:
+            return default
+        DRIVE_DOWNLOAD_BYTES.inc(len(response.content))
+        try:
+            return response.json()
+        except ValueError:
+            return default
+
+    async def write_json(self, file_id: str, access_token: str, data) -> httpx.Response:
+        return await self.send(
+            "PATCH",
+            GOOGLE_DRIVE_UPLOAD_URL.format(file_id=file_id),
+            headers={**auth_headers(access_token), "Content-Type": "application/json"},
+            content=json.dumps(data),
+        )
+
+
+drive = DriveClient()
@@ -1,12 +1,34 @@
+import asyncio
 import os
+import random
+import time
+
+from collections import deque
 from dotenv import load_dotenv
+from fastapi import HTTPException
 from google import genai
+from google.genai import errors
+
+from app import config
+from app.tools.metrics import IN_FLIGHT, count_tokens, observe_stage
 
 
 load_dotenv()
 API_KEY = os.getenv("GEMINI_API_KEY")
 
-client = genai.Client(api_key=API_KEY)
+_client = None
+
+
+def get_client() -> genai.Client:
+    """
+    Shared Gemini client, built on first use so importing the app stays cheap.
+    """
+    global _client
+    if _client is None:
+        _client = genai.Client(api_key=API_KEY)
+    return _client
+
+
 generation_config = {
     "temperature": 1,
     "top_p": 0.95,
@@ -18,9 +40,11 @@ generation_config = {
 # model_to_use = 'gemini-2.0-flash-lite'
 model_to_use = 'gemini-1.5-flash-8b'
 
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
 
 def generate_content(contents: str):
-    response = client.models.generate_content(
+    response = get_client().models.generate_content(
         model=model_to_use,
         config=generation_config,
         contents=contents,
@@ -28,3 +52,168 @@ def generate_content(contents: str):
     return response
 
 
+class AsyncGemini:
+    """
+    Async `generate_content` with a global concurrency limit, jittered retries
+    on 429/5xx (pausing every caller while Gemini asks us to back off) and
+    optional hedging: if an attempt runs longer than the observed p95 latency,
+    a second identical request is sent and the first answer wins.
+    """
+
+    def __init__(self):
+        self.semaphore = None
+        self.latencies = deque(maxlen=config.GEMINI_LATENCY_WINDOW)
+        self.blocked_until = 0.0
+        self.hedges = 0
+        self.retries = 0
+
+    def _get_semaphore(self):
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(config.GEMINI_MAX_CONCURRENCY)
+        return self.semaphore
+
+    def p95(self):
+        if len(self.latencies) < config.GEMINI_HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+    async def _call(self, contents, generation: dict):
+        started = time.monotonic()
+        with observe_stage("gemini", "generate"):
+            response = await get_client().aio.models.generate_content(
+                model=model_to_use,
+                config=generation,
+                contents=contents,
+            )
+        self.latencies.append(time.monotonic() - started)
+        count_tokens(response)
+        return response
+
+    async def _hedged_call(self, contents, generation: dict):
+        hedge_after = self.p95() if config.GEMINI_HEDGE else None
+        first = asyncio.ensure_future(self._call(contents, generation))
+        if hedge_after is None:
+            return await first
+
+        done, _ = await asyncio.wait({first}, timeout=hedge_after)
+        if done:
+            return first.result()
+
+        self.hedges += 1
+        second = asyncio.ensure_future(self._call(contents, generation))
+        pending = {first, second}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if not task.exception():
+                        return task.result()
+            # Both attempts failed; surface the first one's error
+            return first.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    @staticmethod
+    def _retry_delay(error: errors.APIError):
+        # 429 responses carry a google.rpc.RetryInfo detail such as {"retryDelay": "27s"}
+        details = error.details.get("error", {}).get("details", []) if isinstance(error.details, dict) else []
+        for detail in details:
+            delay = detail.get("retryDelay") if isinstance(detail, dict) else None
+            if delay and delay.endswith("s"):
+                try:
+                    return float(delay[:-1])
+                except ValueError:
+                    pass
+        return None
+
+    async def _wait_until_unblocked(self):
+        wait = self.blocked_until - time.monotonic()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def _backoff(self, error: errors.APIError, attempt: int):
+        self.retries += 1
+        delay = random.uniform(0, min(config.GEMINI_BACKOFF_SECONDS * 2 ** attempt, config.GEMINI_MAX_BACKOFF_SECONDS))
+        if error.code == 429:
+            delay = max(delay, self._retry_delay(error) or 0)
+            self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+        await asyncio.sleep(delay)
+
+    async def generate_content(self, contents, **overrides):
+        generation = {**generation_config, **overrides}
+        with IN_FLIGHT.labels("gemini").track_inprogress():
+            async with self._get_semaphore():
+                for attempt in range(config.GEMINI_MAX_RETRIES + 1):
+                    await self._wait_until_unblocked()
+                    try:
+                        return await self._hedged_call(contents, generation)
+                    except errors.APIError as e:
+                        if e.code not in RETRY_STATUS_CODES or attempt == config.GEMINI_MAX_RETRIES:
+                            raise
+                        await self._backoff(e, attempt)
+
+    async def generate_content_stream(self, contents, **overrides):
+        """
+        Stream response chunks. Opening the stream is retried like `generate_content`;
+        once chunks have started flowing, errors are raised to the caller.
+        """
+        generation = {**generation_config, **overrides}
+        with IN_FLIGHT.labels("gemini").track_inprogress():
+            async with self._get_semaphore():
+                for attempt in range(config.GEMINI_MAX_RETRIES + 1):
+                    await self._wait_until_unblocked()
+                    try:
+                        stream = await get_client().aio.models.generate_content_stream(
+                            model=model_to_use,
+                            config=generation,
+                            contents=contents,
+                        )
+                        break
+                    except errors.APIError as e:
+                        if e.code not in RETRY_STATUS_CODES or attempt == config.GEMINI_MAX_RETRIES:
+                            raise
+                        await self._backoff(e, attempt)
+                last = None
+                with observe_stage("gemini", "stream"):
+                    async for chunk in stream:
+                        last = chunk
+                        yield chunk
+                # Usage metadata is cumulative; the final chunk has the totals
+                count_tokens(last)
+
+    def stats(self):
+        return {
+            "p95_seconds": self.p95(),
+            "samples": len(self.latencies),
+            "hedges": self.hedges,
+            "retries": self.retries,
+        }
+
+
+async_gemini = AsyncGemini()
+
+
+def to_http_exception(error: Exception) -> HTTPException:
+    """
+    Map a Gemini failure to an API error, keeping rate limiting visible to clients as 429.
+    """
+    if isinstance(error, HTTPException):
+        return error
+    if isinstance(error, errors.APIError) and error.code == 429:
+        retry_after = max(1, round(async_gemini.blocked_until - time.monotonic()), round(AsyncGemini._retry_delay(error) or 0))
+        return HTTPException(
+            status_code=429,
+            detail="AI service is rate limited, please retry later",
+            headers={"Retry-After": str(retry_after)},
+        )
+    return HTTPException(status_code=500, detail=str(error))
+
+
+async def generate_content_async(contents: str, **overrides):
+    return await async_gemini.generate_content(contents, **overrides)
+
+
+def generate_content_stream_async(contents: str, **overrides):
+    return async_gemini.generate_content_stream(contents, **overrides)
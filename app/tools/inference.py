@@ -0,0 +1,552 @@
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+from fastapi import HTTPException
+
+from app import config
+from app.tools.audio import SAMPLE_RATE, PcmFile, SharedPcm, shared_pcm, split_on_silence
+from app.tools.metrics import track_in_flight
+from app.tools.profiling import current_profile, run_profiled
+
+logger = logging.getLogger(__name__)
+
+# Whisper's input window; shorter clips can share a batched forward pass
+BATCH_CLIP_SECONDS = 30
+
+# "default" runs whisper.load_model as is; "int8" quantizes the Linear layers for CPU inference
+WHISPER_BACKENDS = ("default", "int8")
+
+# Per-process Whisper models, loaded on first use (or by warm-up) and kept for the life of the worker
+_models = {}
+_device = None
+_backend = "default"
+
+
+def _init_worker(device: str | None, threads: int, backend: str = "default"):
+    global _device, _backend
+    import torch
+
+    torch.set_num_threads(threads)
+    _device = device
+    _backend = backend
+
+
+def quantize_int8(model):
+    """
+    Dynamic int8 quantization of the model's Linear layers (weights stored as
+    int8, activations quantized on the fly). CPU only.
+    """
+    import torch
+    import whisper.model
+
+    for module in model.modules():
+        # whisper's Linear subclass only adds dtype casting, and quantize_dynamic matches exact types
+        if type(module) is whisper.model.Linear:
+            module.__class__ = torch.nn.Linear
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+def get_model(model_name: str):
+    model = _models.get(model_name)
+    if model is None:
+        import whisper
+
+        if _backend == "int8":
+            model = quantize_int8(whisper.load_model(model_name, device="cpu"))
+        else:
+            model = whisper.load_model(model_name, device=_device)
+        _models[model_name] = model
+    return model
+
+
+def _warm_up(*model_names: str) -> int:
+    for model_name in model_names:
+        get_model(model_name)
+    return os.getpid()
+
+
+def _transcribe(audio, options: dict, model_name: str):
+    if isinstance(audio, (PcmFile, SharedPcm)):
+        audio = audio.load()
+    return get_model(model_name).transcribe(audio, **options)
+
+
+def _transcribe_batch(clips: list, options: dict, model_name: str) -> list[dict]:
+    """
+    Transcribe clips of at most 30 seconds with one batched encoder/decoder pass.
+    Clips whose greedy decode looks unreliable (the same thresholds `transcribe`
+    uses for its temperature fallback) are redone with `transcribe`.
+    """
+    import torch
+    import whisper
+
+    model = get_model(model_name)
+    mel = torch.stack([
+        whisper.log_mel_spectrogram(whisper.pad_or_trim(np.array(clip)), model.dims.n_mels) for clip in clips
+    ]).to(model.device)
+    decoded = whisper.decode(model, mel, whisper.DecodingOptions(without_timestamps=True, **options))
+
+    results = []
+    for clip, result in zip(clips, decoded):
+        if result.no_speech_prob > 0.6 and result.avg_logprob < -1.0:
+            results.append({"text": "", "segments": [], "language": result.language})
+        elif result.compression_ratio > 2.4 or result.avg_logprob < -1.0:
+            results.append(model.transcribe(clip, **options))
+        else:
+            results.append({
+                "text": result.text,
+                "segments": [{
+                    "id": 0,
+                    "start": 0.0,
+                    "end": len(clip) / SAMPLE_RATE,
+                    "text": result.text,
+                    "tokens": result.tokens,
+                    "temperature": result.temperature,
+                    "avg_logprob": result.avg_logprob,
+                    "compression_ratio": result.compression_ratio,
+                    "no_speech_prob": result.no_speech_prob,
+                }],
+                "language": result.language,
+            })
+    return results
+
+
+class ClipBatcher:
+    """
+    Gathers short clips from concurrent requests for up to `wait_ms`, or until
+    `max_size` are pending, and sends them to a worker as one batch. Each caller
+    awaits its own result.
+    """
+
+    # Options that map onto whisper.DecodingOptions; anything else goes through `transcribe`
+    BATCH_OPTIONS = {"language", "task", "fp16"}
+
+    def __init__(self, pool: "InferencePool", max_size: int, wait_ms: float):
+        self.pool = pool
+        self.max_size = max_size
+        self.wait_ms = wait_ms
+        self.pending: dict[tuple, list] = {}
+        self.timers: dict[tuple, asyncio.TimerHandle] = {}
+        self.running = set()
+        self.batches = 0
+        self.clips = 0
+
+    def accepts(self, audio, options: dict) -> bool:
+        return (
+            self.max_size > 1
+            and isinstance(audio, np.ndarray)
+            and len(audio) <= BATCH_CLIP_SECONDS * SAMPLE_RATE
+            and set(options) <= self.BATCH_OPTIONS
+        )
+
+    async def submit(self, audio: np.ndarray, options: dict, model_name: str) -> dict:
+        loop = asyncio.get_running_loop()
+        key = (model_name, *sorted(options.items()))
+        future = loop.create_future()
+        batch = self.pending.setdefault(key, [])
+        batch.append((audio, future))
+        if len(batch) >= self.max_size:
+            self._flush(key)
+        elif len(batch) == 1:
+            self.timers[key] = loop.call_later(self.wait_ms / 1000, self._flush, key)
+        return await future
+
+    def _flush(self, key: tuple):
+        timer = self.timers.pop(key, None)
+        if timer:
+            timer.cancel()
+        batch = [(audio, future) for audio, future in self.pending.pop(key, []) if not future.done()]
+        if batch:
+            task = asyncio.ensure_future(self._run(batch, key[0], dict(key[1:])))
+            self.running.add(task)
+            task.add_done_callback(self.running.discard)
+
+    async def _run(self, batch: list, model_name: str, options: dict):
+        self.batches += 1
+        self.clips += len(batch)
+        try:
+            results = await self.pool.run(_transcribe_batch, [audio for audio, _ in batch], options, model_name)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self):
+        return {
+            "max_size": self.max_size,
+            "wait_ms": self.wait_ms,
+            "batches": self.batches,
+            "clips": self.clips,
+            "mean_batch_size": round(self.clips / self.batches, 2) if self.batches else None,
+        }
+
+
+class InferencePool:
+    """
+    Pool of Whisper worker processes. Each worker loads the model once, on its
+    first job or during `warm_up`, and the API awaits results without blocking
+    the event loop. `model_name` is the default model; `fallback_models` are
+    faster tiers jobs can be sent to instead (see `app.tools.model_policy`),
+    loaded on first use or, with `WHISPER_PRELOAD_TIERS`, during warm-up.
+    """
+
+    def __init__(
+        self,
+        size: int = config.WHISPER_WORKERS,
+        model_name: str = config.WHISPER_MODEL,
+        device: str | None = config.WHISPER_DEVICE,
+        batch_size: int = config.WHISPER_BATCH_SIZE,
+        batch_wait_ms: float = config.WHISPER_BATCH_WAIT_MS,
+        backend: str = config.WHISPER_BACKEND,
+        fallback_models: list[str] = config.WHISPER_FALLBACK_MODELS,
+    ):
+        if backend not in WHISPER_BACKENDS:
+            raise ValueError(f"Unknown Whisper backend {backend!r}, expected one of {WHISPER_BACKENDS}")
+        self.size = size
+        self.model_name = model_name
+        self.tiers = [model_name, *(name for name in fallback_models if name != model_name)]
+        self.backend = backend
+        self.device = "cpu" if backend == "int8" else device
+        self.batcher = ClipBatcher(self, batch_size, batch_wait_ms)
+        self.threads = config.WHISPER_THREADS or max(1, (os.cpu_count() or 1) // size)
+        self.executor = None
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.restarts = 0
+        self.warmed = False
+        self.rewarming = None
+
+    def start(self):
+        if self.executor:
+            return
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.size,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.device, self.threads, self.backend),
+        )
+
+    def _shutdown(self):
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    def stop(self):
+        if self.rewarming:
+            self.rewarming.cancel()
+        self._shutdown()
+
+    def restart(self, broken: ProcessPoolExecutor | None = None):
+        """
+        Replace the pool. With `broken`, only if it is still the current one, so
+        calls that all saw the same crash don't cancel each other's new jobs.
+        The pool stays ready (`warmed` records the first warm-up); with
+        `WHISPER_WARMUP` the new workers load the model again in the background.
+        """
+        if broken is not None and self.executor is not broken:
+            return
+        self._shutdown()
+        self.restarts += 1
+        self.start()
+        # A crash during that warm-up doesn't start another one, so a worker that can't load the model doesn't loop
+        if config.WHISPER_WARMUP and (self.rewarming is None or self.rewarming.done()):
+            self.rewarming = asyncio.get_running_loop().create_task(self.warm_up())
+
+    async def run(self, func, *args):
+        self.start()
+        executor = self.executor
+        loop = asyncio.get_running_loop()
+        profile = current_profile.get()
+        self.in_flight += 1
+        try:
+            if profile:
+                # Sample inside the worker too and fold its stacks into the request's profile
+                result, stacks = await loop.run_in_executor(executor, run_profiled, func, *args)
+                profile.add_stacks(stacks)
+            else:
+                result = await loop.run_in_executor(executor, func, *args)
+            self.completed += 1
+            return result
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM kill); replace the pool so later jobs can run
+            self.failed += 1
+            self.restart(executor)
+            raise HTTPException(status_code=503, detail="Transcription worker crashed, please retry")
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.in_flight -= 1
+
+    async def warm_up(self):
+        """
+        Start every worker and load the model in each, so the first request
+        doesn't pay for it.
+        """
+        try:
+            models = self.tiers if config.WHISPER_PRELOAD_TIERS else [self.model_name]
+            await asyncio.gather(*[self.run(_warm_up, *models) for _ in range(self.size)])
+        except Exception:
+            logger.exception("Whisper warm-up failed")
+            return
+        self.warmed = True
+
+    def model_key(self, model_name: str | None = None) -> str:
+        """
+        Model name plus backend, for cache keys: int8 transcripts can differ slightly.
+        """
+        model_name = model_name or self.model_name
+        return model_name if self.backend == "default" else f"{model_name}-{self.backend}"
+
+    def ready(self) -> bool:
+        return self.executor is not None and (self.warmed or not config.WHISPER_WARMUP)
+
+    async def transcribe(self, audio, model_name: str | None = None, **options):
+        """
+        Transcribe one recording. Clips of at most 30 seconds held in memory are
+        batched with other concurrent clips for the same model.
+        """
+        model_name = model_name or self.model_name
+        if self.batcher.accepts(audio, options):
+            return await self.batcher.submit(audio, options, model_name)
+        return await self.run(_transcribe, audio, options, model_name)
+
+    async def _transcribe_chunk(self, pcm, chunk, options, checkpoint=None, model_name=None):
+        if checkpoint and (result := checkpoint.get(chunk)) is not None:
+            return result
+        start, end = chunk
+        result = await self.run(_transcribe, pcm[start:end], options, model_name or self.model_name)
+        if checkpoint:
+            checkpoint.put(chunk, result)
+        return result
+
+    async def transcribe_segmented(self, pcm, checkpoint=None, model_name=None, **options):
+        """
+        Cut 16 kHz PCM on silence and transcribe the chunks concurrently across workers.
+        Chunks already in `checkpoint` are reused, and finished ones are added to it.
+        """
+        chunks = split_chunks(pcm, config.SEGMENT_MAX_SECONDS)
+        results = await asyncio.gather(*[self._transcribe_chunk(pcm, chunk, options, checkpoint, model_name) for chunk in chunks])
+        return merge_results(chunks, results)
+
+    async def transcribe_resumable(self, pcm, checkpoint, model_name=None, **options):
+        """
+        Transcribe a long recording one chunk at a time, like a single `transcribe`
+        call: one worker, and each chunk is prompted with the end of the previous
+        chunk's text. Finished chunks go to `checkpoint`, so a retry resumes after
+        the last one.
+        """
+        chunks = split_chunks(pcm, config.SEGMENT_MAX_SECONDS)
+        results = []
+        for chunk in chunks:
+            previous = results[-1].get("text", "").strip() if results else ""
+            chunk_options = {**options, "initial_prompt": previous[-200:]} if previous else options
+            results.append(await self._transcribe_chunk(pcm, chunk, chunk_options, checkpoint, model_name))
+        return merge_results(chunks, results)
+
+    async def stream_segmented(self, pcm, checkpoint=None, model_name=None, **options):
+        """
+        Yield `((start, end), result)` per chunk, in order, as soon as each chunk is decoded.
+        At most one chunk per worker is in flight, so closing the generator early
+        cancels everything that has not started yet. Chunks in `checkpoint` are not decoded again.
+        """
+        chunks = split_chunks(pcm, config.STREAM_CHUNK_SECONDS)
+        pending = deque()
+        next_chunk = 0
+        try:
+            while next_chunk < len(chunks) or pending:
+                while next_chunk < len(chunks) and len(pending) < self.size:
+                    chunk = chunks[next_chunk]
+                    pending.append((chunk, asyncio.ensure_future(self._transcribe_chunk(pcm, chunk, options, checkpoint, model_name))))
+                    next_chunk += 1
+                chunk, task = pending.popleft()
+                yield chunk, await task
+        finally:
+            for _, task in pending:
+                task.cancel()
+
+    def health(self):
+        processes = self.executor._processes if self.executor else {}
+        return {
+            "model": self.model_name,
+            "tiers": self.tiers,
+            "backend": self.backend,
+            "device": self.device or "auto",
+            "warmed": self.warmed,
+            "size": self.size,
+            "threads_per_worker": self.threads,
+            "alive": sum(1 for process in (processes or {}).values() if process.is_alive()),
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "failed": self.failed,
+            "restarts": self.restarts,
+            "batching": self.batcher.stats(),
+        }
+
+
+def split_chunks(pcm, max_chunk_seconds: float) -> list[tuple[int, int]]:
+    return split_on_silence(
+        pcm,
+        max_chunk_seconds=max_chunk_seconds,
+        min_chunk_seconds=min(config.SEGMENT_MIN_SECONDS, max_chunk_seconds / 2),
+        threshold_db=config.SILENCE_THRESHOLD_DB,
+        min_silence_seconds=config.SILENCE_MIN_SECONDS,
+    )
+
+
+def merge_results(chunks: list[tuple[int, int]], results: list[dict]) -> dict:
+    """
+    Stitch per-chunk Whisper results back together in order, shifting segment
+    timestamps by each chunk's offset in the original audio.
+    """
+    segments = []
+    for (start, _), result in zip(chunks, results):
+        offset = start / SAMPLE_RATE
+        for segment in result.get("segments", []):
+            segments.append({
+                **segment,
+                "id": len(segments),
+                "start": segment["start"] + offset,
+                "end": segment["end"] + offset,
+            })
+    texts = [result.get("text", "").strip() for result in results]
+    return {
+        "text": " ".join(text for text in texts if text),
+        "segments": segments,
+        "language": results[0].get("language") if results else None,
+        "chunks": len(chunks),
+    }
+
+
+async def read_message(reader: asyncio.StreamReader) -> dict | None:
+    """
+    One length-prefixed JSON message from the inference server socket, or None at EOF.
+    """
+    try:
+        header = await reader.readexactly(4)
+        return json.loads(await reader.readexactly(int.from_bytes(header, "big")))
+    except asyncio.IncompleteReadError:
+        return None
+
+
+async def write_message(writer: asyncio.StreamWriter, message: dict):
+    data = json.dumps(message).encode()
+    writer.write(len(data).to_bytes(4, "big") + data)
+    await writer.drain()
+
+
+class RemoteInferencePool(InferencePool):
+    """
+    Client of a shared inference server (`python -m app.tools.inference_server`),
+    for running several API workers without a copy of the model in each.
+    Chunking, checkpoints and scheduling still happen here; each Whisper call
+    goes to the server over a Unix socket, with the PCM passed through shared
+    memory (or as a file path when it was spilled to disk). The server batches
+    short clips across all API workers.
+    """
+
+    def __init__(self, socket_path: str = config.INFERENCE_SOCKET, **kwargs):
+        super().__init__(batch_size=1, **kwargs)
+        self.socket_path = socket_path
+        # Last health report from the server
+        self.server = None
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    async def request(self, message: dict) -> dict:
+        try:
+            reader, writer = await asyncio.open_unix_connection(self.socket_path)
+        except OSError:
+            raise HTTPException(status_code=503, detail="Inference server unavailable, please retry")
+        try:
+            await write_message(writer, message)
+            response = await read_message(reader)
+        finally:
+            writer.close()
+        if response is None:
+            raise HTTPException(status_code=503, detail="Inference server closed the connection, please retry")
+        if "error" in response:
+            raise HTTPException(**response["error"])
+        return response
+
+    async def run(self, func, *args):
+        if func is not _transcribe:
+            raise ValueError(f"{func.__name__} cannot run on the inference server")
+        audio, options, model_name = args
+        message = {"op": "transcribe", "model": model_name, "options": options}
+        self.in_flight += 1
+        try:
+            if isinstance(audio, PcmFile):
+                response = await self.request({**message, "file": audio.path, "length": audio.length})
+            else:
+                with shared_pcm(np.asarray(audio, dtype=np.float32)) as shared:
+                    response = await self.request({**message, "shm": shared.name, "length": shared.length})
+            self.completed += 1
+            return response["result"]
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.in_flight -= 1
+
+    async def refresh(self):
+        self.server = (await self.request({"op": "health"}))["health"]
+        # Cache keys and batch concurrency follow the server's model, not this process's settings
+        self.model_name = self.server["model"]
+        self.tiers = self.server["tiers"]
+        self.backend = self.server["backend"]
+        self.size = self.server["size"]
+        self.warmed = self.server["warmed"]
+
+    async def warm_up(self):
+        """
+        Wait until the server is reachable and has loaded the model.
+        """
+        logged = False
+        while not self.warmed:
+            try:
+                await self.refresh()
+            except HTTPException:
+                if not logged:
+                    logger.warning("Waiting for the inference server at %s", self.socket_path)
+                    logged = True
+            if not self.warmed:
+                await asyncio.sleep(1)
+
+    def ready(self) -> bool:
+        return self.warmed or not config.WHISPER_WARMUP
+
+    def health(self):
+        return {
+            "mode": "remote",
+            "socket": self.socket_path,
+            "model": self.model_name,
+            "tiers": self.tiers,
+            "backend": self.backend,
+            "warmed": self.warmed,
+            "size": self.size,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "failed": self.failed,
+            "server": self.server,
+        }
+
+
+inference_pool = RemoteInferencePool() if config.INFERENCE_MODE == "remote" else InferencePool()
+track_in_flight("inference", lambda: inference_pool.in_flight)
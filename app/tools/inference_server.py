@@ -0,0 +1,100 @@
+"""
+Shared inference server: one process owns the Whisper worker pool and serves
+every API worker over a Unix socket, so running more uvicorn workers doesn't
+load more copies of the model.
+
+    python -m app.tools.inference_server
+    INFERENCE_MODE=remote uvicorn app.main:app --workers 4
+
+The server uses the same WHISPER_* settings as a local pool; give the API
+workers the same values so transcript cache keys match.
+"""
+import asyncio
+import logging
+import os
+import signal
+
+from fastapi import HTTPException
+
+from app import config
+from app.tools.audio import SAMPLE_RATE, PcmFile, SharedPcm
+from app.tools.inference import BATCH_CLIP_SECONDS, InferencePool, read_message, write_message
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceServer:
+    """
+    Answers length-prefixed JSON requests: `{"op": "health"}` and
+    `{"op": "transcribe", "shm" | "file": ..., "length": ..., "options": {...}}`.
+    """
+
+    def __init__(self, pool: InferencePool, socket_path: str = config.INFERENCE_SOCKET):
+        self.pool = pool
+        self.socket_path = socket_path
+        self.connections = 0
+
+    def _audio(self, message: dict):
+        if "file" in message:
+            return PcmFile(message["file"], message["length"])
+        shared = SharedPcm(message["shm"], message["length"])
+        # Short clips are copied here so the pool can batch them; long ones are read by the worker
+        return shared.load() if shared.length <= BATCH_CLIP_SECONDS * SAMPLE_RATE else shared
+
+    async def dispatch(self, message: dict) -> dict:
+        try:
+            if message.get("op") == "health":
+                return {"health": {**self.pool.health(), "ready": self.pool.ready(), "connections": self.connections}}
+            if message.get("op") == "transcribe":
+                model_name = message.get("model") or self.pool.model_name
+                if model_name not in self.pool.tiers:
+                    return {"error": {"status_code": 400, "detail": f"Model {model_name!r} is not one of {self.pool.tiers}"}}
+                return {"result": await self.pool.transcribe(self._audio(message), model_name, **message.get("options", {}))}
+            return {"error": {"status_code": 400, "detail": f"Unknown op {message.get('op')!r}"}}
+        except HTTPException as e:
+            return {"error": {"status_code": e.status_code, "detail": e.detail}}
+        except Exception as e:
+            logger.exception("Inference request failed")
+            return {"error": {"status_code": 500, "detail": str(e)}}
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        try:
+            while (message := await read_message(reader)) is not None:
+                await write_message(writer, await self.dispatch(message))
+        except ConnectionError:
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def serve(self):
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        self.pool.start()
+        warm_up = asyncio.create_task(self.pool.warm_up()) if config.WHISPER_WARMUP else None
+        server = await asyncio.start_unix_server(self.handle, path=self.socket_path)
+        os.chmod(self.socket_path, 0o660)
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+        logger.info("Inference server listening on %s", self.socket_path)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if warm_up:
+                warm_up.cancel()
+            self.pool.stop()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(InferenceServer(InferencePool()).serve())
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+
+
+if __name__ == "__main__":
+    main()
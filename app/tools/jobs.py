@@ -0,0 +1,256 @@
+import asyncio
+import json
+import os
+import sqlite3
+import time
+
+from enum import Enum
+from uuid import uuid4
+from fastapi import HTTPException
+
+from app import config
+from app.tools.metrics import track_in_flight
+
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+# Tells this process apart from an earlier one that had the same pid
+PROCESS_TOKEN = uuid4().hex
+
+
+class Job:
+    def __init__(self, user_id: str, stages: list[str]):
+        self.id = uuid4().hex
+        self.user_id = user_id
+        self.owner = f"{os.getpid()}:{PROCESS_TOKEN}"
+        # Called after every change, to persist the job
+        self.on_change = None
+        self.status = JobStatus.QUEUED
+        self.stage = None
+        self.stages = {name: {"status": "pending", "started_at": None, "finished_at": None} for name in stages}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+
+    def _changed(self):
+        if self.on_change:
+            self.on_change(self)
+
+    def start(self):
+        if self.status == JobStatus.QUEUED:
+            self.status = JobStatus.RUNNING
+            self._changed()
+
+    def start_stage(self, name: str):
+        now = time.time()
+        if self.stage and self.stages[self.stage]["status"] == "running":
+            self.stages[self.stage].update({"status": "done", "finished_at": now})
+        self.stage = name
+        self.stages[name].update({"status": "running", "started_at": now})
+        self._changed()
+
+    def finish(self, result: dict):
+        now = time.time()
+        if self.stage:
+            self.stages[self.stage].update({"status": "done", "finished_at": now})
+        self.status = JobStatus.DONE
+        self.result = result
+        self.finished_at = now
+        self._changed()
+
+    def fail(self, error: Exception):
+        now = time.time()
+        if self.stage:
+            self.stages[self.stage].update({"status": "failed", "finished_at": now})
+        if isinstance(error, HTTPException):
+            self.error = {"status_code": error.status_code, "detail": error.detail}
+        else:
+            self.error = {"status_code": 500, "detail": str(error)}
+        self.status = JobStatus.FAILED
+        self.finished_at = now
+        self._changed()
+
+    def to_dict(self):
+        done = sum(1 for stage in self.stages.values() if stage["status"] == "done")
+        return {
+            "job_id": self.id,
+            "status": self.status.value,
+            "stage": self.stage,
+            "progress": round(done / len(self.stages), 2) if self.stages else 0,
+            "stages": [{"name": name, **info} for name, info in self.stages.items()],
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "expires_at": self.finished_at + config.JOB_RETENTION_SECONDS if self.finished_at else None,
+        }
+
+
+class StageTimer:
+    """
+    `on_stage` callback for requests served inline: records how long each
+    pipeline stage took, for the `Server-Timing` response header.
+    """
+
+    def __init__(self):
+        self.durations = {}
+        self.stage = None
+        self.started = None
+
+    def __call__(self, name: str):
+        self._close()
+        self.stage = name
+        self.started = time.perf_counter()
+
+    def _close(self):
+        if self.stage:
+            self.durations[self.stage] = self.durations.get(self.stage, 0) + time.perf_counter() - self.started
+            self.stage = None
+
+    def header(self) -> str:
+        self._close()
+        return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.durations.items())
+
+
+def _owner_alive(owner: str) -> bool:
+    pid, token = owner.split(":")
+    if int(pid) == os.getpid():
+        return token == PROCESS_TOKEN
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class JobStore:
+    """
+    Job state in a local SQLite database that every API worker process on the
+    host shares, so a poll can land on any worker. Each job is written by the
+    process running it; an unfinished job whose process is gone is reported as
+    failed. With an empty `path` the jobs are kept in this process only.
+    """
+
+    def __init__(self, path: str = config.JOBS_DB, retention: int = config.JOB_RETENTION_SECONDS):
+        self.path = path
+        self.retention = retention
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path or ":memory:", check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY, user_id TEXT NOT NULL, owner TEXT NOT NULL,"
+                " job TEXT NOT NULL, created REAL NOT NULL, finished REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_user ON jobs (user_id, created)")
+            self._conn = conn
+        return self._conn
+
+    def save(self, job: Job):
+        self._connect().execute(
+            "INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?, ?, ?)",
+            (job.id, job.user_id, job.owner, json.dumps(job.to_dict(), ensure_ascii=False), job.created_at, job.finished_at),
+        )
+
+    def _load(self, owner: str, data: str) -> dict:
+        job = json.loads(data)
+        if job["status"] in (JobStatus.QUEUED, JobStatus.RUNNING) and not _owner_alive(owner):
+            job.update({
+                "status": JobStatus.FAILED.value,
+                "error": {"status_code": 500, "detail": "The worker running this job stopped, please retry"},
+            })
+        return job
+
+    def get(self, job_id: str, user_id: str) -> dict | None:
+        row = self._connect().execute(
+            "SELECT owner, job FROM jobs WHERE id = ? AND user_id = ?", (job_id, user_id)
+        ).fetchone()
+        return self._load(*row) if row else None
+
+    def list(self, user_id: str) -> list[dict]:
+        rows = self._connect().execute(
+            "SELECT owner, job FROM jobs WHERE user_id = ? ORDER BY created", (user_id,)
+        ).fetchall()
+        return [self._load(*row) for row in rows]
+
+    def purge_expired(self):
+        self._connect().execute("DELETE FROM jobs WHERE finished < ?", (time.time() - self.retention,))
+
+
+class JobRunner:
+    """
+    Jobs run in their own asyncio task in the process that accepted them, and
+    their state goes to a `JobStore` that every API worker reads. Jobs don't
+    wait in a queue of their own: the transcription scheduler decides when
+    each one gets Whisper, so jobs from different users interleave fairly.
+    Finished jobs are kept for JOB_RETENTION_SECONDS so clients can poll or reconnect.
+    """
+
+    def __init__(self, store: JobStore | None = None):
+        self.store = store or JobStore()
+        # Jobs running in this process
+        self.active: dict[str, Job] = {}
+        self.tasks: set[asyncio.Task] = set()
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks.clear()
+
+    def submit(self, user_id: str, stages: list[str], func, *args) -> Job:
+        """
+        Run `func(job, *args)` in the background and return the job right away.
+        The job stays queued until `func` calls `job.start()`.
+        """
+        self.store.purge_expired()
+        job = Job(user_id, stages)
+        job.on_change = self.store.save
+        self.store.save(job)
+        self.active[job.id] = job
+        task = asyncio.create_task(self._run(job, func, args))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return job
+
+    def get(self, job_id: str, user_id: str) -> dict:
+        self.store.purge_expired()
+        job = self.store.get(job_id, user_id)
+        if not job:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return job
+
+    def list(self, user_id: str) -> list[dict]:
+        self.store.purge_expired()
+        return self.store.list(user_id)
+
+    def count(self, status: JobStatus) -> int:
+        return sum(1 for job in self.active.values() if job.status == status)
+
+    async def _run(self, job: Job, func, args):
+        try:
+            job.finish(await func(job, *args))
+        except Exception as e:
+            job.fail(e)
+        finally:
+            self.active.pop(job.id, None)
+
+
+job_runner = JobRunner()
+track_in_flight("jobs_queued", lambda: job_runner.count(JobStatus.QUEUED))
+track_in_flight("jobs_running", lambda: job_runner.count(JobStatus.RUNNING))
@@ -0,0 +1,122 @@
+import asyncio
+import os
+import time
+
+from contextlib import contextmanager
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+
+
+# Buckets from a cached auth check (sub-millisecond) up to a long lecture in Whisper
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+STAGE_SECONDS = Histogram(
+    "lecturecap_stage_duration_seconds",
+    "Time spent in each stage of a pipeline",
+    ["pipeline", "stage"],
+    buckets=STAGE_BUCKETS,
+)
+STAGE_ERRORS = Counter(
+    "lecturecap_stage_errors_total",
+    "Failures by pipeline and the stage that was running",
+    ["pipeline", "stage"],
+)
+AUDIO_SECONDS = Counter("lecturecap_audio_seconds_total", "Seconds of audio transcribed by Whisper")
+AUDIO_TRIMMED_SECONDS = Counter("lecturecap_audio_trimmed_seconds_total", "Seconds of silence cut before Whisper")
+DRIVE_DOWNLOAD_BYTES = Counter("lecturecap_drive_download_bytes_total", "Bytes downloaded from Google Drive")
+GEMINI_TOKENS = Counter("lecturecap_gemini_tokens_total", "Gemini tokens reported in usage metadata", ["kind"])
+# Summed over the live API workers when PROMETHEUS_MULTIPROC_DIR is set
+IN_FLIGHT = Gauge("lecturecap_in_flight", "Work currently queued or running", ["kind"], multiprocess_mode="livesum")
+
+# In-flight counts read from their owner when metrics are collected; callback gauges
+# don't work across processes, so refresh_in_flight() copies them into IN_FLIGHT
+_in_flight_sources = {}
+
+
+def track_in_flight(kind: str, count):
+    _in_flight_sources[kind] = count
+
+
+def refresh_in_flight():
+    for kind, count in _in_flight_sources.items():
+        IN_FLIGHT.labels(kind).set(count())
+
+
+async def keep_in_flight_fresh(interval: float = 5):
+    """
+    With several workers a scrape is answered by one of them, so every worker
+    publishes its in-flight counts on a timer instead of only when scraped.
+    """
+    while True:
+        refresh_in_flight()
+        await asyncio.sleep(interval)
+
+
+def multiprocess_dir() -> str | None:
+    return os.getenv("PROMETHEUS_MULTIPROC_DIR") or os.getenv("prometheus_multiproc_dir")
+
+
+def render_metrics() -> bytes:
+    """
+    Metrics in Prometheus text format. With several API workers, each worker
+    writes its samples under PROMETHEUS_MULTIPROC_DIR and this merges them all.
+    """
+    refresh_in_flight()
+    if not multiprocess_dir():
+        return generate_latest()
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry)
+
+
+def mark_process_dead():
+    if multiprocess_dir():
+        multiprocess.mark_process_dead(os.getpid())
+
+
+@contextmanager
+def observe_stage(pipeline: str, stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.labels(pipeline, stage).inc()
+        raise
+    finally:
+        STAGE_SECONDS.labels(pipeline, stage).observe(time.perf_counter() - started)
+
+
+class StageObserver:
+    """
+    Wraps an `on_stage` callback: each call closes the previous stage's timer
+    and starts the next. `fail()` counts an error against the running stage.
+    """
+
+    def __init__(self, pipeline: str, on_stage=None):
+        self.pipeline = pipeline
+        self.on_stage = on_stage or (lambda stage: None)
+        self.stage = None
+        self.started = None
+
+    def __call__(self, name: str):
+        self.finish()
+        self.stage = name
+        self.started = time.perf_counter()
+        self.on_stage(name)
+
+    def finish(self):
+        if self.stage:
+            STAGE_SECONDS.labels(self.pipeline, self.stage).observe(time.perf_counter() - self.started)
+            self.stage = None
+
+    def fail(self):
+        if self.stage:
+            STAGE_ERRORS.labels(self.pipeline, self.stage).inc()
+        self.finish()
+
+
+def count_tokens(response):
+    usage = getattr(response, "usage_metadata", None)
+    if usage:
+        GEMINI_TOKENS.labels("prompt").inc(usage.prompt_token_count or 0)
+        GEMINI_TOKENS.labels("output").inc(usage.candidates_token_count or 0)
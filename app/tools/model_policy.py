@@ -0,0 +1,63 @@
+from app import config
+from app.tools.inference import InferencePool, inference_pool
+
+
+# Approximate decoding speed of each Whisper model relative to "large" (from the openai-whisper README)
+MODEL_SPEED = {"tiny": 10, "base": 7, "small": 4, "medium": 2, "large": 1, "turbo": 8}
+
+QUALITY_HINTS = ("auto", "fast", "best")
+
+
+def model_speed(model_name: str) -> float:
+    # "small.en" and "large-v3" are as fast as "small" and "large"
+    return MODEL_SPEED.get(model_name.split(".")[0].split("-")[0], 1)
+
+
+class ModelPolicy:
+    """
+    Picks the Whisper model for each job from the pool's `tiers` (best first,
+    read on every call since a remote pool takes them from the server). A client
+    can ask for the `best` or the `fast` tier; otherwise (`auto`) the job drops
+    one tier for every `downgrade_seconds` threshold its expected wait passes.
+    The expected wait is the queue ahead of the job plus the job's own Whisper
+    time on the default model.
+    """
+
+    def __init__(self, pool: InferencePool, downgrade_seconds: list[float] = config.MODEL_DOWNGRADE_SECONDS):
+        self.pool = pool
+        self.downgrade_seconds = sorted(downgrade_seconds)
+        self.chosen = {}
+
+    @property
+    def tiers(self) -> list[str]:
+        return self.pool.tiers
+
+    def choose(self, quality: str, expected_seconds: float) -> str:
+        if quality == "best":
+            tier = 0
+        elif quality == "fast":
+            tier = len(self.tiers) - 1
+        else:
+            tier = sum(1 for threshold in self.downgrade_seconds if expected_seconds > threshold)
+        model_name = self.tiers[min(tier, len(self.tiers) - 1)]
+        self.chosen[model_name] = self.chosen.get(model_name, 0) + 1
+        return model_name
+
+    def acceptable(self, quality: str) -> list[str]:
+        """
+        Tiers whose cached transcripts satisfy `quality`, best first. Only `best`
+        refuses a cached transcript from a faster model.
+        """
+        return self.tiers[:1] if quality == "best" else self.tiers
+
+    def work_factor(self, model_name: str) -> float:
+        """
+        Whisper time of `model_name` relative to the default (first) tier.
+        """
+        return model_speed(self.tiers[0]) / model_speed(model_name)
+
+    def stats(self):
+        return {"tiers": self.tiers, "downgrade_seconds": self.downgrade_seconds, "chosen": self.chosen}
+
+
+model_policy = ModelPolicy(inference_pool)
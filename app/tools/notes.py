@@ -0,0 +1,120 @@
+import asyncio
+import copy
+
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from fastapi import HTTPException
+
+from app import config
+from app.tools.drive import drive
+
+
+class NotesEntry:
+    def __init__(self, file_id: str, version: str, notes: list):
+        self.file_id = file_id
+        self.version = version
+        self.notes = notes
+
+
+class NotesStore:
+    """
+    Per-user cache of the appDataFolder notes.json: its file id, last known Drive
+    `version` and content. Repeat jobs skip the file list call, and skip the
+    download too when the version hasn't moved.
+
+    Writes hold a per-user lock and are conditional: the version is checked right
+    before the PATCH, and if another client changed the file, the fresh notes are
+    downloaded and the update is applied again.
+    """
+
+    def __init__(self, max_users: int = config.NOTES_CACHE_MAX_USERS):
+        self.max_users = max_users
+        self.entries: OrderedDict[str, NotesEntry] = OrderedDict()
+        self.locks: dict[str, asyncio.Lock] = {}
+        # Updates holding or waiting for each user's lock; a lock is kept while in use or cached
+        self.lock_users: dict[str, int] = {}
+        self.conflicts = 0
+
+    def _remember(self, user_id: str, entry: NotesEntry):
+        self.entries[user_id] = entry
+        self.entries.move_to_end(user_id)
+        while len(self.entries) > self.max_users:
+            evicted, _ = self.entries.popitem(last=False)
+            if evicted not in self.lock_users:
+                self.locks.pop(evicted, None)
+
+    @asynccontextmanager
+    async def _locked(self, user_id: str):
+        lock = self.locks.setdefault(user_id, asyncio.Lock())
+        self.lock_users[user_id] = self.lock_users.get(user_id, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self.lock_users[user_id] -= 1
+            if not self.lock_users[user_id]:
+                del self.lock_users[user_id]
+                if user_id not in self.entries:
+                    self.locks.pop(user_id, None)
+
+    async def _load(self, user_id: str, access_token: str) -> tuple[NotesEntry | None, bool]:
+        """
+        Current notes for the user and whether the cached copy was just confirmed
+        to still be at Drive's latest version.
+        """
+        entry = self.entries.get(user_id)
+        if entry:
+            version = await drive.get_version(entry.file_id, access_token)
+            if version is not None and version == entry.version:
+                return entry, True
+            if version is None:
+                # File was deleted or replaced; look it up again
+                self.entries.pop(user_id, None)
+                entry = None
+
+        if entry:
+            file_id = entry.file_id
+        else:
+            notes_file = await drive.find_notes_file(access_token)
+            if not notes_file:
+                return None, False
+            file_id, version = notes_file["id"], notes_file.get("version")
+
+        notes = await drive.read_json(file_id, access_token, default=[])
+        entry = NotesEntry(file_id, version, notes if isinstance(notes, list) else [])
+        self._remember(user_id, entry)
+        return entry, False
+
+    async def update(self, user_id: str, access_token: str, apply) -> list:
+        """
+        Run `apply(notes)` on the current notes.json and write it back, merging
+        and retrying if the file changed under us. Raises 404 if the user has no
+        notes.json (or it can't be listed).
+        """
+        async with self._locked(user_id):
+            for _ in range(config.NOTES_MAX_RETRIES):
+                entry, confirmed = await self._load(user_id, access_token)
+                if entry is None:
+                    raise HTTPException(status_code=404, detail="Note not found in notes.json")
+                notes = copy.deepcopy(entry.notes)
+                apply(notes)
+
+                # Only write over the version we merged into
+                if not confirmed and await drive.get_version(entry.file_id, access_token) != entry.version:
+                    self.conflicts += 1
+                    continue
+
+                response = await drive.write_json(entry.file_id, access_token, notes)
+                if not response.is_success:
+                    self.entries.pop(user_id, None)
+                    raise HTTPException(status_code=500, detail="Failed to update notes.json on Google Drive")
+                self._remember(user_id, NotesEntry(entry.file_id, response.json().get("version"), notes))
+                return notes
+
+        raise HTTPException(status_code=409, detail="notes.json kept changing on Google Drive, please retry")
+
+    def stats(self):
+        return {"users": len(self.entries), "conflicts": self.conflicts}
+
+
+notes_store = NotesStore()
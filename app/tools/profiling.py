@@ -0,0 +1,203 @@
+import contextvars
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+from collections import Counter
+from uuid import uuid4
+
+from starlette.datastructures import Headers
+
+from app import config
+from app.auth.dependencies import is_admin
+
+
+class Sampler:
+    """
+    Wall-clock sampling profiler: a background thread records the Python stack of
+    every other thread each `interval` seconds, as collapsed stacks
+    (`root;outer;inner count`, the input format of flamegraph.pl and speedscope).
+    """
+
+    def __init__(self, interval: float = config.PROFILE_INTERVAL_MS / 1000, root: str | None = None):
+        self.interval = interval
+        self.root = root
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self):
+        names = {}
+        while not self._stop.wait(self.interval):
+            self.samples += 1
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == self._thread.ident:
+                    continue
+                if thread_id not in names:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                frames = []
+                while frame is not None:
+                    code = frame.f_code
+                    frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                root = self.root or names.get(thread_id, str(thread_id))
+                self.stacks[";".join([root, *reversed(frames)])] += 1
+
+
+class Profile:
+    """
+    A profile of one request: samples from the API process plus stacks sent back
+    by worker processes that ran part of it.
+    """
+
+    def __init__(self, method: str, path: str, reason: str):
+        self.id = uuid4().hex
+        self.method = method
+        self.path = path
+        self.reason = reason
+        self.started_at = time.time()
+        self.sampler = Sampler().start()
+        self.stacks = Counter()
+
+    def add_stacks(self, stacks: dict):
+        self.stacks.update(stacks)
+
+    def finish(self, status_code: int):
+        self.stacks.update(self.sampler.stop())
+        profile_store.save(self, status_code)
+
+
+# Set for the duration of a profiled request, so offloaded work can profile itself too
+current_profile: contextvars.ContextVar[Profile | None] = contextvars.ContextVar("current_profile", default=None)
+
+
+def run_profiled(func, *args):
+    """
+    Run `func(*args)` (in a worker process) under a sampler and return
+    `(result, stacks)`.
+    """
+    sampler = Sampler(root=f"worker-{os.getpid()}").start()
+    try:
+        result = func(*args)
+    finally:
+        stacks = sampler.stop()
+    return result, dict(stacks)
+
+
+class ProfileStore:
+    """
+    Profiles on local disk: `<id>.collapsed` with the stacks and `<id>.json` with
+    request details. Only the newest `max_profiles` are kept.
+    """
+
+    def __init__(self, directory: str = config.PROFILE_DIR, max_profiles: int = config.PROFILE_MAX_FILES):
+        self.directory = directory
+        self.max_profiles = max_profiles
+
+    def save(self, profile: Profile, status_code: int):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, f"{profile.id}.collapsed"), "w", encoding="utf-8") as f:
+            f.writelines(f"{stack} {count}\n" for stack, count in profile.stacks.most_common())
+        meta = {
+            "id": profile.id,
+            "method": profile.method,
+            "path": profile.path,
+            "reason": profile.reason,
+            "status_code": status_code,
+            "started_at": profile.started_at,
+            "duration_seconds": round(time.time() - profile.started_at, 3),
+            "interval_ms": config.PROFILE_INTERVAL_MS,
+            "samples": profile.sampler.samples,
+        }
+        with open(os.path.join(self.directory, f"{profile.id}.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        self.evict()
+
+    def list(self) -> list[dict]:
+        if not os.path.isdir(self.directory):
+            return []
+        profiles = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                try:
+                    with open(os.path.join(self.directory, name), encoding="utf-8") as f:
+                        profiles.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+        return sorted(profiles, key=lambda meta: meta["started_at"], reverse=True)
+
+    def path(self, profile_id: str) -> str | None:
+        path = os.path.join(self.directory, f"{profile_id}.collapsed")
+        return path if profile_id.isalnum() and os.path.isfile(path) else None
+
+    def evict(self):
+        for meta in self.list()[self.max_profiles:]:
+            for suffix in (".json", ".collapsed"):
+                try:
+                    os.remove(os.path.join(self.directory, meta["id"] + suffix))
+                except OSError:
+                    pass
+
+
+profile_store = ProfileStore()
+
+
+# Never worth profiling when sampling at random
+UNSAMPLED_PATHS = ("/ping", "/ready", "/metrics", "/admin")
+
+
+def profiling_reason(scope) -> str | None:
+    headers = Headers(scope=scope)
+    if headers.get("x-profile") == "1" and is_admin(headers):
+        return "header"
+    if config.PROFILE_SAMPLE_RATE and not scope["path"].startswith(UNSAMPLED_PATHS):
+        if random.random() < config.PROFILE_SAMPLE_RATE:
+            return "sampled"
+    return None
+
+
+class ProfilingMiddleware:
+    """
+    Profiles a request when an admin sends `X-Profile: 1` (with `X-Admin-Token`),
+    or at random for `PROFILE_SAMPLE_RATE` of requests. The profile covers the
+    whole response, streamed bodies included, and its id is returned in the
+    `X-Profile-Id` header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        reason = profiling_reason(scope) if scope["type"] == "http" else None
+        if not reason:
+            return await self.app(scope, receive, send)
+
+        profile = Profile(scope["method"], scope["path"], reason)
+        status_code = 500
+
+        async def send_with_profile_id(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message = {**message, "headers": [*message.get("headers", []), (b"x-profile-id", profile.id.encode())]}
+            await send(message)
+
+        token = current_profile.set(profile)
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            current_profile.reset(token)
+            profile.finish(status_code)
@@ -0,0 +1,316 @@
+import asyncio
+import contextvars
+import math
+import time
+
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from fastapi import HTTPException
+
+from app import config
+from app.tools.metrics import track_in_flight
+
+
+class TokenBucket:
+    """
+    Per-user quota in seconds of audio. Work is charged once its real duration is
+    known, so the balance can go negative; new requests are refused until it is
+    back above zero.
+    """
+
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def charge(self, amount: float):
+        self._refill()
+        self.tokens -= amount
+
+    def refund(self, amount: float):
+        self.charge(-amount)
+
+    def seconds_until_positive(self) -> float:
+        self._refill()
+        if self.tokens > 0:
+            return 0.0
+        # A quota that never refills stays used up
+        return -self.tokens / self.rate if self.rate > 0 else math.inf
+
+
+class Waiter:
+    def __init__(self, user_id: str, cost: float, weight: float, work_factor: float = 1.0):
+        self.user_id = user_id
+        self.cost = cost
+        self.weight = weight
+        # Whisper time relative to the default model, for jobs sent to a faster tier
+        self.work_factor = work_factor
+        self.future = asyncio.get_running_loop().create_future()
+
+    @property
+    def work(self) -> float:
+        """
+        Slot-seconds of audio: a batched clip shares its slot with others, and a
+        job spread over several slots splits its audio across them.
+        """
+        return self.cost * self.work_factor * min(self.weight, 1.0)
+
+
+class Reservation:
+    """
+    Admitted work that hasn't reached `slot` yet (the recording is still being
+    downloaded and decoded, or the job hasn't started): `jobs` placeholder jobs
+    that wait estimates count like queued ones. Each `slot` taken while the
+    reservation is active replaces one placeholder; the rest are released on
+    exit or by `release`. `on_start` is called whenever one of its jobs gets
+    its turn.
+    """
+
+    def __init__(self, scheduler: "TranscriptionScheduler", user_id: str, jobs: int):
+        self.scheduler = scheduler
+        self.user_id = user_id
+        self.jobs = jobs
+        self.on_start = None
+
+    def claim(self):
+        if self.jobs:
+            self.jobs -= 1
+            self.scheduler._unreserve(self.user_id, 1)
+
+    def release(self):
+        if self.jobs:
+            self.scheduler._unreserve(self.user_id, self.jobs)
+            self.jobs = 0
+
+    def __enter__(self):
+        current_reservation.set(self)
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+        current_reservation.set(None)
+
+
+# Set while a request or job runs, so `slot` can replace its placeholder with the real job
+current_reservation: contextvars.ContextVar[Reservation | None] = contextvars.ContextVar("current_reservation", default=None)
+
+
+class TranscriptionScheduler:
+    """
+    Bounded, fair admission in front of Whisper.
+
+    Jobs cost their audio duration. Running jobs are limited to `slots` (short
+    clips that the pool batches count as a fraction of a slot, and one job can
+    always run even when `slots` is below one) and to `per_user` per user. Free
+    slots go round-robin across users with waiting jobs, so one user's backlog
+    delays everyone else by at most one job per round. Requests are refused with 429 and `Retry-After` when the user's quota
+    is used up or their estimated queue wait exceeds `max_wait`. Admitted
+    requests count as `reserve_seconds` of audio each until their real job is
+    queued, so a burst of requests can't all pass while they are downloading.
+    """
+
+    def __init__(
+        self,
+        slots: float = config.SCHEDULER_SLOTS,
+        per_user: int = config.SCHEDULER_USER_CONCURRENCY,
+        max_wait: float = config.SCHEDULER_MAX_WAIT_SECONDS,
+        quota_seconds: float = config.USER_QUOTA_AUDIO_SECONDS,
+        quota_per_hour: float = config.USER_QUOTA_AUDIO_SECONDS_PER_HOUR,
+        realtime_factor: float = config.SCHEDULER_REALTIME_FACTOR,
+        reserve_seconds: float = config.SCHEDULER_RESERVE_SECONDS,
+    ):
+        self.slots = slots
+        self.per_user = per_user
+        self.max_wait = max_wait
+        self.quota_seconds = quota_seconds
+        self.quota_rate = quota_per_hour / 3600
+        # Wall seconds of Whisper time per second of audio, per slot; learned from finished jobs
+        self.realtime_factor = realtime_factor
+        self.reserve_seconds = reserve_seconds
+        self.buckets: dict[str, TokenBucket] = {}
+        self.waiting: OrderedDict[str, deque[Waiter]] = OrderedDict()
+        self.running: dict[str, int] = {}
+        self.running_jobs: dict[Waiter, float] = {}
+        # Placeholder jobs per user, from `admit` until `slot`
+        self.reserved: dict[str, int] = {}
+        self.in_use = 0.0
+        self.rejected = 0
+
+    def _bucket(self, user_id: str) -> TokenBucket:
+        bucket = self.buckets.get(user_id)
+        if bucket is None:
+            if len(self.buckets) >= config.SCHEDULER_MAX_USERS:
+                self._forget_idle_users()
+            bucket = self.buckets[user_id] = TokenBucket(self.quota_seconds, self.quota_rate)
+        return bucket
+
+    def _forget_idle_users(self):
+        # A full bucket holds no state worth keeping
+        for user_id, bucket in list(self.buckets.items()):
+            if bucket.seconds_until_positive() == 0 and bucket.tokens >= bucket.capacity:
+                del self.buckets[user_id]
+
+    def _weight(self, cost: float) -> float:
+        if config.WHISPER_BATCH_SIZE > 1 and cost <= 30:
+            return 1 / config.WHISPER_BATCH_SIZE
+        return 1.0
+
+    def _pending(self, user_id: str) -> list[tuple[float, float]]:
+        """
+        `(slot-seconds of audio, slot weight)` of the user's queued jobs, then their placeholders.
+        """
+        queued = [(waiter.work, waiter.weight) for waiter in self.waiting.get(user_id, ())]
+        return queued + [(self.reserve_seconds, 1.0)] * self.reserved.get(user_id, 0)
+
+    def estimated_wait(self, user_id: str, admitted: bool = False) -> float:
+        """
+        Seconds until a new job from `user_id` would start: what is left of the
+        running jobs, plus the jobs that round-robin puts ahead of it (the user's
+        own queued and admitted jobs, and as many jobs from each other user).
+        With `admitted`, the job already holds one of the user's placeholders,
+        which isn't counted as ahead of it.
+        """
+        own = self._pending(user_id)
+        if admitted and self.reserved.get(user_id):
+            own.pop()
+        ahead = list(own)
+        for other in self.waiting.keys() | self.reserved.keys():
+            if other != user_id:
+                ahead += self._pending(other)[:len(own) + 1]
+        if self.in_use + sum(weight for _, weight in ahead) + 1 <= self.slots:
+            return 0.0
+        now = time.monotonic()
+        remaining = sum(
+            max(0.0, waiter.work * self.realtime_factor - (now - started) * waiter.weight)
+            for waiter, started in self.running_jobs.items()
+        )
+        return (remaining + sum(work for work, _ in ahead) * self.realtime_factor) / self.slots
+
+    def _reject(self, retry_after: float, detail: str):
+        self.rejected += 1
+        raise HTTPException(
+            status_code=429,
+            detail=detail,
+            headers={"Retry-After": str(max(1, math.ceil(min(retry_after, 86400))))},
+        )
+
+    def admit(self, user_id: str, jobs: int = 1) -> Reservation:
+        """
+        Refuse the request up front if the user is over quota or would wait too long,
+        otherwise reserve `jobs` placeholder jobs for it until they reach `slot`.
+        """
+        quota_wait = self._bucket(user_id).seconds_until_positive()
+        if quota_wait > 0:
+            self._reject(quota_wait, "Transcription quota used up, please retry later")
+        wait = self.estimated_wait(user_id)
+        if wait > self.max_wait:
+            self._reject(wait - self.max_wait, "Transcription queue is full, please retry later")
+        self.reserved[user_id] = self.reserved.get(user_id, 0) + jobs
+        return Reservation(self, user_id, jobs)
+
+    def _unreserve(self, user_id: str, jobs: int):
+        self.reserved[user_id] -= jobs
+        if not self.reserved[user_id]:
+            del self.reserved[user_id]
+
+    def _can_run(self, waiter: Waiter) -> bool:
+        if self.running.get(waiter.user_id, 0) >= self.per_user:
+            return False
+        # An idle scheduler always runs one job, even with a fractional share of a shared server
+        return self.in_use + waiter.weight <= self.slots or not self.running_jobs
+
+    def _dispatch(self):
+        """
+        Start waiting jobs round-robin across users while there is capacity.
+        """
+        progress = True
+        while progress and self.waiting:
+            progress = False
+            for user_id in list(self.waiting):
+                queue = self.waiting[user_id]
+                while queue and queue[0].future.done():
+                    queue.popleft()
+                if not queue:
+                    del self.waiting[user_id]
+                    continue
+                if not self._can_run(queue[0]):
+                    continue
+                waiter = queue.popleft()
+                self.running[user_id] = self.running.get(user_id, 0) + 1
+                self.in_use += waiter.weight
+                self.running_jobs[waiter] = time.monotonic()
+                waiter.future.set_result(None)
+                # Served users go to the back of the round
+                self.waiting.move_to_end(user_id)
+                if not queue:
+                    del self.waiting[user_id]
+                progress = True
+                break
+
+    def _release(self, waiter: Waiter):
+        started = self.running_jobs.pop(waiter)
+        self.running[waiter.user_id] -= 1
+        if not self.running[waiter.user_id]:
+            del self.running[waiter.user_id]
+        self.in_use -= waiter.weight
+        if waiter.cost >= 10:
+            observed = (time.monotonic() - started) * waiter.weight / waiter.work
+            self.realtime_factor = 0.8 * self.realtime_factor + 0.2 * observed
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, user_id: str, audio_seconds: float, work_factor: float = 1.0, width: int = 1):
+        """
+        Charge the user's quota for `audio_seconds` and wait for a fair turn to run.
+        `work_factor` scales the expected Whisper time, for models faster than the default.
+        A job that keeps `width` workers busy at once (segmented or streamed) holds
+        that many slots, up to all of them.
+        """
+        reservation = current_reservation.get()
+        if reservation and reservation.user_id != user_id:
+            reservation = None
+        if reservation:
+            reservation.claim()
+        self._bucket(user_id).charge(audio_seconds)
+        weight = self._weight(audio_seconds) if width <= 1 else min(width, max(1.0, self.slots))
+        waiter = Waiter(user_id, audio_seconds, weight, work_factor)
+        self.waiting.setdefault(user_id, deque()).append(waiter)
+        self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter in self.running_jobs:
+                self._release(waiter)
+            else:
+                waiter.future.cancel()
+                self._bucket(user_id).refund(audio_seconds)
+            raise
+        if reservation and reservation.on_start:
+            reservation.on_start()
+        try:
+            yield
+        finally:
+            self._release(waiter)
+
+    def stats(self):
+        return {
+            "slots": self.slots,
+            "in_use": round(self.in_use, 3),
+            "running_users": len(self.running),
+            "waiting": sum(len(queue) for queue in self.waiting.values()),
+            "waiting_users": len(self.waiting),
+            "reserved": sum(self.reserved.values()),
+            "realtime_factor": round(self.realtime_factor, 3),
+            "rejected": self.rejected,
+        }
+
+
+scheduler = TranscriptionScheduler()
+track_in_flight("scheduler_waiting", lambda: sum(len(queue) for queue in scheduler.waiting.values()))
+track_in_flight("scheduler_reserved", lambda: sum(scheduler.reserved.values()))
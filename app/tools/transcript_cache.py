@@ -0,0 +1,81 @@
+import hashlib
+import json
+import os
+
+from app import config
+
+
+class TranscriptCache:
+    """
+    Content-addressed JSON cache on local disk with size-based LRU eviction.
+    Entries are keyed by a namespace plus parts such as the audio hash, model
+    name and prompt version; reading an entry refreshes its mtime.
+    """
+
+    def __init__(self, directory: str = config.TRANSCRIPT_CACHE_DIR, max_bytes: int = config.TRANSCRIPT_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = {}
+        self.misses = {}
+        self.evictions = 0
+
+    def _path(self, namespace: str, parts: tuple) -> str:
+        digest = hashlib.sha256("\0".join(str(part) for part in parts).encode()).hexdigest()
+        return os.path.join(self.directory, f"{namespace}-{digest}.json")
+
+    def get(self, namespace: str, *parts):
+        path = self._path(namespace, parts)
+        try:
+            with open(path, encoding="utf-8") as f:
+                value = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            self.misses[namespace] = self.misses.get(namespace, 0) + 1
+            return None
+        self.hits[namespace] = self.hits.get(namespace, 0) + 1
+        return value
+
+    def put(self, namespace: str, value, *parts):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(namespace, parts)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(value, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def _entries(self):
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(".json"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def evict(self):
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self.evictions += 1
+
+    def stats(self):
+        entries = self._entries() if os.path.isdir(self.directory) else []
+        return {
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+transcript_cache = TranscriptCache()
@@ -1,4 +1,5 @@
 import subprocess
+import json
 import re
 
 # sudo apt update && sudo apt install ffmpeg
@@ -19,3 +20,52 @@ def clean_text(text):
     """
     text = re.sub(r'\\"|\\|\"', '', text)
     return text
+
+
+class StreamingTextCleaner:
+    """
+    Applies clean_text to streamed chunks. A trailing backslash is held back until
+    the next chunk, so an escaped quote split across two chunks is still removed.
+    """
+
+    def __init__(self):
+        self.pending = ""
+
+    def feed(self, chunk: str) -> str:
+        text = self.pending + chunk
+        if text.endswith("\\"):
+            text, self.pending = text[:-1], "\\"
+        else:
+            self.pending = ""
+        return clean_text(text)
+
+    def flush(self) -> str:
+        text, self.pending = self.pending, ""
+        return clean_text(text)
+
+
+def parse_json_object(text: str) -> dict | None:
+    """
+    Parse a JSON object from model output, tolerating Markdown code fences, text
+    around the object and raw newlines inside strings. Returns None when no
+    valid object is found.
+    """
+    text = re.sub(r"^```(?:json)?\s*|\s*```$", "", (text or "").strip())
+    start, end = text.find("{"), text.rfind("}")
+    for candidate in (text, text[start:end + 1] if 0 <= start < end else None):
+        if candidate is None:
+            continue
+        try:
+            value = json.loads(candidate, strict=False)
+        except ValueError:
+            continue
+        if isinstance(value, dict):
+            return value
+    return None
+
+
+def sse_event(event: str, data: dict) -> str:
+    """
+    Format one Server-Sent Events message.
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
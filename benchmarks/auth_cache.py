@@ -0,0 +1,89 @@
+"""
+Per-request auth overhead of `get_current_user` with and without the verified-token cache.
+
+Firebase verification is replaced by the same RS256 check against a locally
+generated key, so the numbers include real signature verification but no
+certificate fetches.
+
+    python -m benchmarks.auth_cache --requests 2000
+"""
+import argparse
+import asyncio
+import time
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from google.auth import crypt, jwt
+from starlette.requests import Request
+
+from app.auth import dependencies
+from app.auth.token_cache import token_cache
+from benchmarks.common import report
+
+
+def make_token_and_verifier():
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_pem = key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ).decode()
+    public_pem = key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    ).decode()
+    now = int(time.time())
+    claims = {
+        "iss": "https://securetoken.google.com/bench",
+        "aud": "bench",
+        "sub": "bench-user",
+        "uid": "bench-user",
+        "iat": now,
+        "exp": now + 3600,
+    }
+    token = jwt.encode(crypt.RSASigner.from_string(private_pem, key_id="bench"), claims).decode()
+
+    def verify_id_token(id_token, app=None, clock_skew_seconds=0):
+        return jwt.decode(id_token, certs={"bench": public_pem}, audience="bench", clock_skew_in_seconds=clock_skew_seconds)
+
+    return token, verify_id_token
+
+
+async def measure(token: str, requests: int, cached: bool) -> float:
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "headers": [(b"authorization", f"Bearer {token}".encode())],
+    }
+    token_cache.clear()
+    started = time.perf_counter()
+    for _ in range(requests):
+        if not cached:
+            token_cache.clear()
+        await dependencies.get_current_user(Request(scope))
+    return (time.perf_counter() - started) / requests
+
+
+async def run(args):
+    token, verify_id_token = make_token_and_verifier()
+    dependencies.auth.verify_id_token = verify_id_token
+    # The fake verifier needs no Firebase app, so don't load credentials
+    dependencies.get_firebase_app = lambda: None
+    uncached = await measure(token, args.requests, cached=False)
+    cached = await measure(token, args.requests, cached=True)
+    return {
+        "requests": args.requests,
+        "uncached_us_per_request": round(uncached * 1e6, 1),
+        "cached_us_per_request": round(cached * 1e6, 1),
+        "speedup": round(uncached / cached, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+    report(asyncio.run(run(args)), args.output)
+
+
+if __name__ == "__main__":
+    main()
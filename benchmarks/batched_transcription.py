@@ -0,0 +1,73 @@
+"""
+Clips per second for many concurrent short recordings, one `transcribe` call per
+clip versus dynamic batching of the clips into shared forward passes.
+
+    python -m benchmarks.batched_transcription --audio sample.wav --clips 64 --clip-seconds 10
+"""
+import argparse
+import asyncio
+import time
+
+from app import config
+from app.tools.audio import SAMPLE_RATE, load_pcm
+from app.tools.inference import InferencePool
+from benchmarks.common import report, synthetic_recording, word_error_rate
+
+
+async def measure(clips: list, args, batch_size: int):
+    pool = InferencePool(size=args.workers, model_name=args.model, batch_size=batch_size, batch_wait_ms=args.wait_ms)
+    pool.start()
+    try:
+        await pool.warm_up()
+        started = time.perf_counter()
+        results = await asyncio.gather(*[pool.transcribe(clip, fp16=False) for clip in clips])
+        seconds = time.perf_counter() - started
+        return results, seconds, pool.batcher.stats()
+    finally:
+        pool.stop()
+
+
+async def run(args):
+    clip = load_pcm(args.audio)
+    clips = [
+        synthetic_recording(clip, args.clip_seconds, gap_seconds=args.gap, seed=seed)
+        for seed in range(args.clips)
+    ]
+
+    single, single_seconds, _ = await measure(clips, args, batch_size=1)
+    batched, batched_seconds, batching = await measure(clips, args, batch_size=args.batch_size)
+
+    wer = sum(word_error_rate(a["text"], b["text"]) for a, b in zip(single, batched)) / len(clips)
+    return {
+        "clips": args.clips,
+        "clip_seconds": args.clip_seconds,
+        "model": args.model,
+        "workers": args.workers,
+        "batch_size": args.batch_size,
+        "batch_wait_ms": args.wait_ms,
+        "mean_batch_size": batching["mean_batch_size"],
+        "single_clips_per_second": round(args.clips / single_seconds, 2),
+        "batched_clips_per_second": round(args.clips / batched_seconds, 2),
+        "speedup": round(single_seconds / batched_seconds, 2),
+        "word_agreement": round(1 - wer, 4),
+        "audio_seconds_per_clip": round(len(clips[0]) / SAMPLE_RATE, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--audio", required=True, help="speech clip used to build the short recordings")
+    parser.add_argument("--clips", type=int, default=64)
+    parser.add_argument("--clip-seconds", type=float, default=10)
+    parser.add_argument("--gap", type=float, default=0.5, help="pause between repetitions, in seconds")
+    parser.add_argument("--workers", type=int, default=config.WHISPER_WORKERS)
+    parser.add_argument("--batch-size", type=int, default=max(2, config.WHISPER_BATCH_SIZE))
+    parser.add_argument("--wait-ms", type=float, default=config.WHISPER_BATCH_WAIT_MS)
+    parser.add_argument("--model", default=config.WHISPER_MODEL)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+    report(asyncio.run(run(args)), args.output)
+
+
+if __name__ == "__main__":
+    main()
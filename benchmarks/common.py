@@ -0,0 +1,75 @@
+import json
+import re
+import socket
+import sys
+
+import numpy as np
+
+from app.tools.audio import SAMPLE_RATE
+
+
+def normalize_words(text: str) -> list[str]:
+    return re.sub(r"[^\w\s]", "", text.lower()).split()
+
+
+def word_error_rate(reference: str, hypothesis: str) -> float:
+    """
+    Word-level Levenshtein distance divided by the reference length.
+    """
+    ref, hyp = normalize_words(reference), normalize_words(hypothesis)
+    if not ref:
+        return 0.0 if not hyp else 1.0
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        current = [i] + [0] * len(hyp)
+        for j, hyp_word in enumerate(hyp, 1):
+            current[j] = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (ref_word != hyp_word),
+            )
+        previous = current
+    return previous[-1] / len(ref)
+
+
+def synthetic_recording(clip: np.ndarray, seconds: float, gap_seconds: float = 1.5, seed: int = 0) -> np.ndarray:
+    """
+    Build a long recording by repeating a speech clip with pauses of low-level noise in between.
+    """
+    rng = np.random.default_rng(seed)
+    gap = (0.002 * rng.standard_normal(int(gap_seconds * SAMPLE_RATE))).astype(np.float32)
+    parts, total = [], 0
+    while total < seconds * SAMPLE_RATE:
+        parts += [clip, gap]
+        total += len(clip) + len(gap)
+    return np.concatenate(parts)[:int(seconds * SAMPLE_RATE)]
+
+
+def percentiles(seconds: list[float]) -> dict | None:
+    """
+    p50/p95/p99, mean and max of a list of durations, in milliseconds.
+    """
+    if not seconds:
+        return None
+    ms = np.asarray(seconds) * 1000
+    return {
+        "p50": round(float(np.percentile(ms, 50)), 1),
+        "p95": round(float(np.percentile(ms, 95)), 1),
+        "p99": round(float(np.percentile(ms, 99)), 1),
+        "mean": round(float(ms.mean()), 1),
+        "max": round(float(ms.max()), 1),
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def report(results: dict, output: str | None = None):
+    text = json.dumps(results, indent=2)
+    if output:
+        with open(output, "w") as f:
+            f.write(text)
+    sys.stdout.write(text + "\n")
@@ -0,0 +1,180 @@
+"""
+Local stand-ins for the external services, used by the load test: a fake Google
+Drive API server, a fake Gemini client with configurable latency, and an app
+factory that wires the Gemini stub in and bypasses Firebase token verification.
+
+    FAKE_GEMINI_LATENCY_MS=500 DRIVE_API_URL=http://127.0.0.1:9000 uvicorn benchmarks.fakes:create_app --factory
+"""
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+
+from types import SimpleNamespace
+
+import uvicorn
+from fastapi import FastAPI, Request, Response
+
+
+class FakeDrive:
+    """
+    In-memory Drive covering the calls made by `app.tools.drive`: the notes.json
+    lookup in appDataFolder, metadata (md5Checksum, version), media download and
+    media upload. Every file id other than a notes file serves the same audio.
+
+    Each file id gets its own md5Checksum so transcripts are not served from the
+    cache, unless `distinct_md5` is off.
+    """
+
+    def __init__(self, audio: bytes, latency_ms: float = 0, distinct_md5: bool = True):
+        self.audio = audio
+        self.audio_md5 = hashlib.md5(audio).hexdigest()
+        self.latency = latency_ms / 1000
+        self.distinct_md5 = distinct_md5
+        # access token -> {"id", "version", "notes"}
+        self.notes_files = {}
+        self.requests = 0
+        self.app = self._build_app()
+
+    def add_note(self, access_token: str, note_id: str):
+        notes_file = self.notes_files.setdefault(
+            access_token, {"id": f"notes-{len(self.notes_files)}", "version": 1, "notes": []}
+        )
+        notes_file["notes"].append({"id": note_id, "title": "", "content": "", "isTranscribed": False})
+
+    def _notes_file(self, request: Request, file_id: str | None = None):
+        token = request.headers.get("Authorization", "")[len("Bearer "):]
+        notes_file = self.notes_files.get(token)
+        if notes_file and file_id not in (None, notes_file["id"]):
+            return None
+        return notes_file
+
+    def _build_app(self) -> FastAPI:
+        app = FastAPI()
+
+        @app.middleware("http")
+        async def latency(request: Request, call_next):
+            self.requests += 1
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            return await call_next(request)
+
+        @app.get("/drive/v3/files")
+        async def list_files(request: Request):
+            notes_file = self._notes_file(request)
+            files = [{"id": notes_file["id"], "version": str(notes_file["version"])}] if notes_file else []
+            return {"files": files}
+
+        @app.get("/drive/v3/files/{file_id}")
+        async def get_file(file_id: str, request: Request, alt: str | None = None, fields: str = ""):
+            if file_id.startswith("notes-"):
+                notes_file = self._notes_file(request, file_id)
+                if not notes_file:
+                    return Response(status_code=404)
+                if alt == "media":
+                    return Response(json.dumps(notes_file["notes"]), media_type="application/json")
+                return {"id": file_id, "version": str(notes_file["version"])}
+            if alt == "media":
+                return Response(self.audio, media_type="application/octet-stream")
+            md5 = hashlib.md5(f"{file_id}:{self.audio_md5}".encode()).hexdigest() if self.distinct_md5 else self.audio_md5
+            return {"md5Checksum": md5, "size": str(len(self.audio)), "version": "1"}
+
+        @app.patch("/upload/drive/v3/files/{file_id}")
+        async def upload_file(file_id: str, request: Request):
+            notes_file = self._notes_file(request, file_id)
+            if not notes_file:
+                return Response(status_code=404)
+            notes_file["notes"] = json.loads(await request.body())
+            notes_file["version"] += 1
+            return {"id": file_id, "version": str(notes_file["version"])}
+
+        return app
+
+
+class FakeGeminiClient:
+    """
+    Stands in for `genai.Client`: answers every prompt after `latency_ms`, as a
+    JSON object with every field of the response schema when one is requested.
+    """
+
+    def __init__(self, latency_ms: float = 0, stream_chunks: int = 8):
+        self.latency = latency_ms / 1000
+        self.stream_chunks = stream_chunks
+        self.calls = 0
+        self.models = SimpleNamespace(generate_content=self._generate_sync)
+        self.aio = SimpleNamespace(models=SimpleNamespace(
+            generate_content=self._generate,
+            generate_content_stream=self._generate_stream,
+        ))
+
+    def _response(self, contents, config=None) -> SimpleNamespace:
+        self.calls += 1
+        text = " ".join(str(contents).split()[-200:])
+        schema = (config or {}).get("response_schema")
+        if schema:
+            fields = {field: "Lecture notes" if field == "title" else text for field in schema["properties"]}
+            return SimpleNamespace(text=json.dumps(fields))
+        return SimpleNamespace(text=text)
+
+    def _generate_sync(self, model, config, contents):
+        time.sleep(self.latency)
+        return self._response(contents, config)
+
+    async def _generate(self, model, config, contents):
+        await asyncio.sleep(self.latency)
+        return self._response(contents, config)
+
+    async def _generate_stream(self, model, config, contents):
+        text = self._response(contents, config).text
+        step = max(1, len(text) // self.stream_chunks)
+
+        async def chunks():
+            for start in range(0, len(text), step):
+                await asyncio.sleep(self.latency / self.stream_chunks)
+                yield SimpleNamespace(text=text[start:start + step])
+
+        return chunks()
+
+
+class ServerThread:
+    """
+    Runs an ASGI app with uvicorn on its own thread and event loop, so a fake
+    service doesn't share a loop with the load generator.
+    """
+
+    def __init__(self, app, port: int):
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+        self.url = f"http://127.0.0.1:{port}"
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            if not self.thread.is_alive():
+                raise RuntimeError(f"Server on {self.url} failed to start")
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+def create_app():
+    """
+    The real app with Gemini replaced by `FakeGeminiClient` and the bearer
+    token used as the user id instead of being verified by Firebase.
+    """
+    from app.auth.dependencies import get_current_user
+    from app.main import app
+    from app.tools import genai_client
+
+    genai_client._client = FakeGeminiClient(float(os.getenv("FAKE_GEMINI_LATENCY_MS", "0")))
+
+    async def fake_current_user(request: Request):
+        return {"uid": request.headers.get("Authorization", "")[len("Bearer "):]}
+
+    app.dependency_overrides[get_current_user] = fake_current_user
+    return app
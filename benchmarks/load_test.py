@@ -0,0 +1,209 @@
+"""
+End-to-end load test of /transcribe and /summarize without Google credentials.
+
+The app runs in its own uvicorn process with Gemini stubbed out and the bearer
+token accepted as the user id (see `benchmarks.fakes.create_app`), and talks to
+a fake Drive server started here. Whisper is real, so pick a small model with
+WHISPER_MODEL for quick runs. Reports latency percentiles, throughput and
+per-stage time (from the `Server-Timing` header of /transcribe) as JSON.
+
+    python -m benchmarks.load_test --audio sample.wav --endpoint transcribe --requests 50 --concurrency 8
+    python -m benchmarks.load_test --endpoint summarize --requests 500 --concurrency 50 --gemini-latency-ms 800
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+from collections import Counter, defaultdict
+
+import httpx
+
+from app import config
+from benchmarks.common import free_port, percentiles, report
+from benchmarks.fakes import FakeDrive, ServerThread
+
+
+ENDPOINTS = {"transcribe": "/transcribe/", "summarize": "/summarize/"}
+
+
+def parse_server_timing(header: str) -> dict[str, float]:
+    """
+    `download;dur=12.5, transcribe;dur=830.1` -> seconds per stage.
+    """
+    stages = {}
+    for metric in filter(None, (part.strip() for part in header.split(","))):
+        name, *params = metric.split(";")
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "dur":
+                stages[name.strip()] = float(value) / 1000
+    return stages
+
+
+def build_requests(args, drive: FakeDrive | None) -> list[tuple[str, str, dict]]:
+    """
+    `(endpoint, user token, JSON body)` for every request, spread round-robin over the users.
+    """
+    endpoints = list(ENDPOINTS) if args.endpoint == "mixed" else [args.endpoint]
+    text = " ".join(["The lecture covered Markov decision processes and Q-learning."] * (args.summary_words // 8))
+    requests = []
+    for i in range(args.requests):
+        endpoint = endpoints[i % len(endpoints)]
+        token = f"user-{i % args.users}"
+        if endpoint == "transcribe":
+            note_id = str(uuid.uuid4())
+            drive.add_note(token, note_id)
+            body = {"file_id": f"audio-{i}", "access_token": token, "note_id": note_id, "segmented": args.segmented}
+        else:
+            body = {"text": text}
+        requests.append((endpoint, token, body))
+    return requests
+
+
+async def wait_until_warm(client: httpx.AsyncClient, timeout: float):
+    started = time.monotonic()
+    while time.monotonic() - started < timeout:
+        try:
+            response = await client.get("/ping")
+            if response.status_code == 200 and (response.json()["inference_pool"]["warmed"] or not config.WHISPER_WARMUP):
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.2)
+    raise TimeoutError("The app did not finish warming up")
+
+
+async def drive_load(client: httpx.AsyncClient, requests: list, concurrency: int) -> list[dict]:
+    queue = asyncio.Queue()
+    for request in requests:
+        queue.put_nowait(request)
+    samples = []
+
+    async def worker():
+        while not queue.empty():
+            endpoint, token, body = queue.get_nowait()
+            started = time.perf_counter()
+            try:
+                response = await client.post(ENDPOINTS[endpoint], json=body, headers={"Authorization": f"Bearer {token}"})
+                status, timing = response.status_code, response.headers.get("Server-Timing", "")
+            except httpx.HTTPError as e:
+                status, timing = type(e).__name__, ""
+            samples.append({
+                "endpoint": endpoint,
+                "status": status,
+                "seconds": time.perf_counter() - started,
+                "stages": parse_server_timing(timing),
+            })
+
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return samples
+
+
+def summarize_samples(samples: list[dict], duration: float) -> dict:
+    by_endpoint = defaultdict(list)
+    for sample in samples:
+        by_endpoint[sample["endpoint"]].append(sample)
+
+    endpoints = {}
+    for endpoint, items in by_endpoint.items():
+        ok = [item for item in items if item["status"] == 200]
+        stages = defaultdict(list)
+        for item in ok:
+            for name, seconds in item["stages"].items():
+                stages[name].append(seconds)
+        endpoints[endpoint] = {
+            "requests": len(items),
+            "ok": len(ok),
+            "statuses": {str(status): count for status, count in Counter(item["status"] for item in items).items()},
+            "throughput_rps": round(len(ok) / duration, 2),
+            "latency_ms": percentiles([item["seconds"] for item in ok]),
+            "stages_ms": {name: percentiles(values) for name, values in stages.items()},
+        }
+    return endpoints
+
+
+async def run(args, app_url: str, drive: FakeDrive, requests: list) -> dict:
+    timeout = httpx.Timeout(args.request_timeout)
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=app_url, timeout=timeout, limits=limits) as client:
+        await wait_until_warm(client, args.startup_timeout)
+        started = time.perf_counter()
+        samples = await drive_load(client, requests, args.concurrency)
+        duration = time.perf_counter() - started
+        ping = (await client.get("/ping")).json()
+
+    return {
+        "config": {
+            "endpoint": args.endpoint,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "users": args.users,
+            "segmented": args.segmented,
+            "drive_latency_ms": args.drive_latency_ms,
+            "gemini_latency_ms": args.gemini_latency_ms,
+            "cache_hits_allowed": args.cache_hits,
+            "whisper_model": ping["inference_pool"]["model"],
+            "whisper_workers": ping["inference_pool"]["size"],
+        },
+        "duration_seconds": round(duration, 2),
+        "throughput_rps": round(sum(1 for sample in samples if sample["status"] == 200) / duration, 2),
+        "endpoints": summarize_samples(samples, duration),
+        "drive_requests": drive.requests,
+        "app": ping,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoint", choices=["transcribe", "summarize", "mixed"], default="mixed")
+    parser.add_argument("--audio", help="recording served by the fake Drive (required for transcribe and mixed)")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--segmented", action="store_true", help="send transcriptions with segmented=true")
+    parser.add_argument("--summary-words", type=int, default=800, help="length of the text sent to /summarize")
+    parser.add_argument("--drive-latency-ms", type=float, default=20)
+    parser.add_argument("--gemini-latency-ms", type=float, default=500)
+    parser.add_argument("--cache-hits", action="store_true", help="give every recording the same md5 so the transcript cache is used")
+    parser.add_argument("--request-timeout", type=float, default=600)
+    parser.add_argument("--startup-timeout", type=float, default=300)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+    if args.endpoint != "summarize" and not args.audio:
+        parser.error("--audio is required unless --endpoint summarize")
+
+    audio = b""
+    if args.audio:
+        with open(args.audio, "rb") as f:
+            audio = f.read()
+    drive = FakeDrive(audio, args.drive_latency_ms, distinct_md5=not args.cache_hits)
+    requests = build_requests(args, drive)
+
+    app_port = free_port()
+    with ServerThread(drive.app, free_port()) as drive_server, tempfile.TemporaryDirectory() as cache_dir:
+        env = {
+            **os.environ,
+            "DRIVE_API_URL": drive_server.url,
+            "TRANSCRIPT_CACHE_DIR": cache_dir,
+            "FAKE_GEMINI_LATENCY_MS": str(args.gemini_latency_ms),
+        }
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "benchmarks.fakes:create_app", "--factory",
+             "--port", str(app_port), "--log-level", "warning"],
+            env=env,
+        )
+        try:
+            results = asyncio.run(run(args, f"http://127.0.0.1:{app_port}", drive, requests))
+        finally:
+            server.terminate()
+            server.wait()
+    report(results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+fp32 (default backend) versus int8 dynamic quantization on CPU: real-time factor,
+peak RSS and how far the int8 transcript drifts from the fp32 one. Each backend
+runs in a fresh process so peak RSS is not shared between them.
+
+    python -m benchmarks.quantization --audio sample.wav --threads 4
+    python -m benchmarks.quantization --audio sample.wav --reference sample.txt
+"""
+import argparse
+import multiprocessing
+import resource
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+
+from app import config
+from app.tools.audio import SAMPLE_RATE, load_pcm
+from benchmarks.common import report, word_error_rate
+
+
+def measure(audio_path: str, model_name: str, backend: str, threads: int) -> dict:
+    from app.tools import inference
+
+    inference._init_worker("cpu", threads, backend)
+    pcm = load_pcm(audio_path)
+
+    started = time.perf_counter()
+    model = inference.get_model(model_name)
+    load_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    result = model.transcribe(pcm, fp16=False)
+    seconds = time.perf_counter() - started
+
+    return {
+        "load_seconds": round(load_seconds, 2),
+        "transcribe_seconds": round(seconds, 2),
+        "real_time_factor": round(seconds / (len(pcm) / SAMPLE_RATE), 4),
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "text": result["text"],
+    }
+
+
+def run_backend(args, backend: str) -> dict:
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        return executor.submit(measure, args.audio, args.model, backend, args.threads).result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--audio", required=True, help="speech recording to transcribe")
+    parser.add_argument("--reference", help="text file with the correct transcript, to report each backend's WER")
+    parser.add_argument("--threads", type=int, default=config.WHISPER_THREADS or multiprocessing.cpu_count())
+    parser.add_argument("--model", default=config.WHISPER_MODEL)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    results = {backend: run_backend(args, backend) for backend in ("default", "int8")}
+    fp32, int8 = results["default"], results["int8"]
+    summary = {
+        "audio_seconds": round(len(load_pcm(args.audio)) / SAMPLE_RATE, 2),
+        "model": args.model,
+        "threads": args.threads,
+        "speedup": round(fp32["transcribe_seconds"] / int8["transcribe_seconds"], 2),
+        "rss_saved_mb": round(fp32["peak_rss_mb"] - int8["peak_rss_mb"], 1),
+        "int8_vs_fp32_wer": round(word_error_rate(fp32["text"], int8["text"]), 4),
+    }
+    if args.reference:
+        with open(args.reference, encoding="utf-8") as f:
+            reference = f.read()
+        for backend, result in results.items():
+            result["wer"] = round(word_error_rate(reference, result["text"]), 4)
+    for result in results.values():
+        result.pop("text")
+    report({**summary, "backends": results}, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Compare single-pass and segmented transcription on a synthetic long recording.
+
+    python -m benchmarks.segmented_transcription --audio sample.wav --minutes 60 --workers 4
+"""
+import argparse
+import asyncio
+import time
+
+from app import config
+from app.tools.audio import SAMPLE_RATE, load_pcm
+from app.tools.inference import InferencePool
+from benchmarks.common import report, synthetic_recording, word_error_rate
+
+
+async def run(args):
+    clip = load_pcm(args.audio)
+    pcm = synthetic_recording(clip, args.minutes * 60, gap_seconds=args.gap)
+
+    pool = InferencePool(size=args.workers, model_name=args.model)
+    pool.start()
+    try:
+        # Load the model in every worker before timing anything
+        await pool.warm_up()
+        if not pool.warmed:
+            raise RuntimeError("Whisper warm-up failed")
+
+        started = time.perf_counter()
+        single = await pool.transcribe(pcm, fp16=False)
+        single_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        segmented = await pool.transcribe_segmented(pcm, fp16=False)
+        segmented_seconds = time.perf_counter() - started
+    finally:
+        pool.stop()
+
+    wer = word_error_rate(single["text"], segmented["text"])
+    return {
+        "audio_seconds": len(pcm) / SAMPLE_RATE,
+        "model": args.model,
+        "workers": args.workers,
+        "segment_max_seconds": config.SEGMENT_MAX_SECONDS,
+        "chunks": segmented["chunks"],
+        "single_pass_seconds": round(single_seconds, 2),
+        "segmented_seconds": round(segmented_seconds, 2),
+        "speedup": round(single_seconds / segmented_seconds, 2),
+        "word_agreement": round(1 - wer, 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--audio", required=True, help="speech clip repeated to build the long recording")
+    parser.add_argument("--minutes", type=float, default=60)
+    parser.add_argument("--gap", type=float, default=1.5, help="pause between repetitions, in seconds")
+    parser.add_argument("--workers", type=int, default=config.WHISPER_WORKERS)
+    parser.add_argument("--model", default=config.WHISPER_MODEL)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+    report(asyncio.run(run(args)), args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Memory and throughput versus the number of uvicorn workers, with Whisper loaded
+in every API worker (INFERENCE_MODE=local) or once in a shared inference
+server (INFERENCE_MODE=remote).
+
+Each configuration runs the app with `uvicorn --workers N` against the fake
+Drive and Gemini from `benchmarks.fakes`. The benchmark sends /transcribe
+requests for distinct recordings and reports throughput, latency and the
+resident memory of the whole process tree (RSS, plus PSS, which counts shared
+pages once).
+
+    WHISPER_MODEL=tiny python -m benchmarks.shared_inference --audio sample.wav --api-workers 1 2 4 --requests 40
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.common import free_port, percentiles, report
+from benchmarks.fakes import FakeDrive, ServerThread
+from benchmarks.load_test import build_requests, drive_load
+
+
+def process_tree(root: int) -> list[int]:
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The command name may contain spaces, so split after its closing parenthesis
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    pids, stack = [], [root]
+    while stack:
+        pid = stack.pop()
+        pids.append(pid)
+        stack.extend(children.get(pid, []))
+    return pids
+
+
+def memory_mb(roots: list[int]) -> dict:
+    """
+    Summed RSS and PSS of the given processes and all their descendants.
+    """
+    totals = {"Rss": 0, "Pss": 0}
+    for root in roots:
+        for pid in process_tree(root):
+            try:
+                with open(f"/proc/{pid}/smaps_rollup") as f:
+                    for line in f:
+                        key, _, value = line.partition(":")
+                        if key in totals:
+                            totals[key] += int(value.split()[0])
+            except OSError:
+                continue
+    return {"rss_mb": round(totals["Rss"] / 1024, 1), "pss_mb": round(totals["Pss"] / 1024, 1)}
+
+
+async def wait_until_warm(client: httpx.AsyncClient, workers: int, timeout: float):
+    """
+    /ping lands on a random worker, so wait for several warm answers in a row.
+    """
+    started = time.monotonic()
+    streak = 0
+    while streak < 4 * workers:
+        if time.monotonic() - started > timeout:
+            raise TimeoutError("The app did not finish warming up")
+        try:
+            response = await client.get("/ping")
+            streak = streak + 1 if response.status_code == 200 and response.json()["inference_pool"]["warmed"] else 0
+        except httpx.HTTPError:
+            streak = 0
+        if not streak:
+            await asyncio.sleep(0.2)
+
+
+async def measure(args, app_url: str, workers: int, roots: list[int], requests: list) -> dict:
+    timeout = httpx.Timeout(args.request_timeout)
+    async with httpx.AsyncClient(base_url=app_url, timeout=timeout) as client:
+        await wait_until_warm(client, workers, args.startup_timeout)
+        idle = memory_mb(roots)
+        started = time.perf_counter()
+        samples = await drive_load(client, requests, args.concurrency)
+        duration = time.perf_counter() - started
+    ok = [sample["seconds"] for sample in samples if sample["status"] == 200]
+    return {
+        "ok": len(ok),
+        "failed": len(samples) - len(ok),
+        "throughput_rps": round(len(ok) / duration, 2),
+        "latency_ms": percentiles(ok),
+        "memory_idle": idle,
+        "memory_after_load": memory_mb(roots),
+    }
+
+
+def run_config(args, mode: str, workers: int, audio: bytes) -> dict:
+    drive = FakeDrive(audio, args.drive_latency_ms)
+    request_args = argparse.Namespace(
+        endpoint="transcribe", requests=args.requests, users=args.users, segmented=False, summary_words=0,
+    )
+    requests = build_requests(request_args, drive)
+    app_port = free_port()
+    with ServerThread(drive.app, free_port()) as drive_server, tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ,
+            "INFERENCE_MODE": mode,
+            "API_WORKERS": str(workers),
+            "INFERENCE_SOCKET": os.path.join(tmp, "inference.sock"),
+            "DRIVE_API_URL": drive_server.url,
+            "TRANSCRIPT_CACHE_DIR": os.path.join(tmp, "transcripts"),
+            "CHECKPOINT_DB": "",
+            "FAKE_GEMINI_LATENCY_MS": str(args.gemini_latency_ms),
+        }
+        processes = []
+        try:
+            if mode == "remote":
+                processes.append(subprocess.Popen([sys.executable, "-m", "app.tools.inference_server"], env=env))
+            processes.append(subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "benchmarks.fakes:create_app", "--factory",
+                 "--port", str(app_port), "--workers", str(workers), "--log-level", "warning"],
+                env=env,
+            ))
+            result = asyncio.run(measure(args, f"http://127.0.0.1:{app_port}", workers, [p.pid for p in processes], requests))
+        finally:
+            for process in reversed(processes):
+                process.terminate()
+                process.wait()
+    return {"mode": mode, "api_workers": workers, **result}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--audio", required=True, help="recording served by the fake Drive for every request")
+    parser.add_argument("--api-workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--modes", nargs="+", choices=["local", "remote"], default=["local", "remote"])
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--users", type=int, default=16)
+    parser.add_argument("--drive-latency-ms", type=float, default=20)
+    parser.add_argument("--gemini-latency-ms", type=float, default=200)
+    parser.add_argument("--request-timeout", type=float, default=600)
+    parser.add_argument("--startup-timeout", type=float, default=300)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    with open(args.audio, "rb") as f:
+        audio = f.read()
+    runs = [run_config(args, mode, workers, audio) for workers in args.api_workers for mode in args.modes]
+    report({
+        "config": {
+            "whisper_model": os.getenv("WHISPER_MODEL", "small"),
+            "whisper_workers": int(os.getenv("WHISPER_WORKERS", "1")),
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+        },
+        "runs": runs,
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Startup cost of the API: how long `import app.main` takes, and how long a fresh
+uvicorn process needs until `/ping` answers (first successful request) and until
+`/ready` reports the Whisper workers warmed up.
+
+Each measurement runs in a new interpreter, so nothing is shared between runs.
+
+    python -m benchmarks.startup --runs 5
+    python -m benchmarks.startup --runs 5 --no-warmup
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks.common import free_port, report
+
+
+IMPORT_SNIPPET = "import time; started = time.perf_counter(); import app.main; print(time.perf_counter() - started)"
+
+
+def measure_import(env: dict) -> float:
+    out = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], env=env, capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def wait_for(url: str, started: float, timeout: float) -> float | None:
+    while time.perf_counter() - started < timeout:
+        try:
+            if httpx.get(url, timeout=1).status_code == 200:
+                return time.perf_counter() - started
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.02)
+    return None
+
+
+def measure_server(env: dict, timeout: float) -> dict:
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+    try:
+        first_request = wait_for(f"http://127.0.0.1:{port}/ping", started, timeout)
+        ready = wait_for(f"http://127.0.0.1:{port}/ready", started, timeout)
+    finally:
+        server.terminate()
+        server.wait()
+    return {"first_request": first_request, "ready": ready}
+
+
+def summarize(values: list) -> dict | None:
+    values = [value for value in values if value is not None]
+    if not values:
+        return None
+    return {"median": round(statistics.median(values), 3), "min": round(min(values), 3), "max": round(max(values), 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--no-warmup", action="store_true", help="start with WHISPER_WARMUP=false")
+    parser.add_argument("--timeout", type=float, default=300, help="seconds to wait for /ping and /ready")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    env = {**os.environ, "WHISPER_WARMUP": "false" if args.no_warmup else "true"}
+    imports = [measure_import(env) for _ in range(args.runs)]
+    servers = [measure_server(env, args.timeout) for _ in range(args.runs)]
+    report({
+        "runs": args.runs,
+        "warmup": not args.no_warmup,
+        "import_seconds": summarize(imports),
+        "first_request_seconds": summarize([server["first_request"] for server in servers]),
+        "ready_seconds": summarize([server["ready"] for server in servers]),
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from app.tools.audio import SAMPLE_RATE, DecodedAudio, OffsetMap, frame_energy_db
+
+
+def test_offset_map_shifts_each_kept_range():
+    # Kept 0-2 s and 5-6 s of the original; 2 s of trimmed audio is 5 s of the original
+    offsets = OffsetMap([(0, 2 * SAMPLE_RATE), (5 * SAMPLE_RATE, 6 * SAMPLE_RATE)])
+
+    assert offsets.to_original(0) == 0
+    assert offsets.to_original(1.5) == 1.5
+    assert offsets.to_original(2) == 5
+    assert offsets.to_original(2.25) == 5.25
+
+
+def test_offset_map_with_a_late_first_range():
+    offsets = OffsetMap([(SAMPLE_RATE, 2 * SAMPLE_RATE)])
+
+    assert offsets.to_original(0.5) == 1.5
+
+
+def test_empty_offset_map_is_identity():
+    assert OffsetMap([]).to_original(3.0) == 3.0
+
+
+def test_trim_silence_maps_timestamps_back():
+    rng = np.random.default_rng(0)
+    speech = (0.3 * rng.standard_normal(3 * SAMPLE_RATE)).astype(np.float32)
+    silence = np.zeros(10 * SAMPLE_RATE, np.float32)
+    audio = DecodedAudio(np.concatenate([speech, silence, speech]), "md5")
+
+    audio.trim_silence(min_silence_seconds=2, keep_seconds=0.5)
+
+    assert audio.duration == pytest.approx(6.5, abs=0.05)
+    assert audio.original_duration == 16
+    # The second burst of speech starts 3.5 s into the trimmed audio and 13 s into the original
+    assert audio.original_time(3.5) == pytest.approx(13, abs=0.05)
+
+
+def test_frame_energy_matches_across_blocks():
+    pcm = (0.1 * np.random.default_rng(1).standard_normal(150 * SAMPLE_RATE)).astype(np.float32)
+    frame = SAMPLE_RATE * 30 // 1000
+    frames = pcm[:len(pcm) // frame * frame].reshape(-1, frame)
+    expected = 20 * np.log10(np.sqrt(np.mean(np.square(frames), axis=1)))
+
+    np.testing.assert_allclose(frame_energy_db(pcm), expected, rtol=1e-5)
@@ -0,0 +1,37 @@
+from app import config
+from app.tools.chunking import split_text
+
+
+def test_short_text_is_one_chunk():
+    assert split_text("One paragraph.\n\nAnother one.", max_tokens=100) == ["One paragraph.\n\nAnother one."]
+
+
+def test_chunks_break_on_paragraphs_and_sentences():
+    paragraphs = [" ".join(f"Sentence {p}.{s} is here." for s in range(5)) for p in range(6)]
+    text = "\n\n".join(paragraphs)
+    max_tokens = 40
+
+    chunks = split_text(text, max_tokens=max_tokens)
+
+    assert len(chunks) > 1
+    assert all(len(chunk) <= max_tokens * config.CHARS_PER_TOKEN for chunk in chunks)
+    assert all(chunk.endswith(".") for chunk in chunks)
+    assert " ".join(chunks).split() == text.split()
+
+
+def test_overlong_sentence_is_cut_on_whitespace():
+    text = " ".join(f"word{i}" for i in range(200))
+
+    chunks = split_text(text, max_tokens=20, max_chunks=100)
+
+    assert all(len(chunk) <= 20 * config.CHARS_PER_TOKEN for chunk in chunks)
+    assert " ".join(chunks).split() == text.split()
+
+
+def test_chunk_size_grows_to_respect_max_chunks():
+    text = "\n\n".join(f"Paragraph number {i}." for i in range(100))
+
+    chunks = split_text(text, max_tokens=5, max_chunks=4)
+
+    assert len(chunks) <= 4
+    assert " ".join(chunks).split() == text.split()
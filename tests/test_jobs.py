@@ -0,0 +1,44 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.tools.jobs import Job, JobRunner, JobStatus, JobStore
+
+
+def test_job_is_visible_from_another_worker(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    runner = JobRunner(JobStore(path))
+    other_worker = JobRunner(JobStore(path))
+
+    async def work(job):
+        job.start()
+        job.start_stage("transcribe")
+        assert other_worker.get(job.id, "user")["status"] == "running"
+        return {"text": "hello"}
+
+    async def run():
+        job = runner.submit("user", ["transcribe"], work)
+        assert other_worker.get(job.id, "user")["status"] == "queued"
+        await asyncio.gather(*runner.tasks)
+        return job
+
+    job = asyncio.run(run())
+    result = other_worker.get(job.id, "user")
+    assert result["status"] == "done"
+    assert result["result"] == {"text": "hello"}
+    assert [item["job_id"] for item in other_worker.list("user")] == [job.id]
+    assert runner.count(JobStatus.RUNNING) == 0
+
+    with pytest.raises(HTTPException) as error:
+        other_worker.get(job.id, "someone-else")
+    assert error.value.status_code == 404
+
+
+def test_unfinished_job_of_a_stopped_worker_is_failed(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    job = Job("user", ["transcribe"])
+    job.owner = f"{job.owner.split(':')[0]}:an-earlier-process"
+    store.save(job)
+
+    assert store.get(job.id, "user")["status"] == "failed"
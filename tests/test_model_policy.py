@@ -0,0 +1,32 @@
+import numpy as np
+
+from app.routers import transcribe
+from app.tools.audio import SAMPLE_RATE, DecodedAudio
+from app.tools.model_policy import ModelPolicy
+from app.tools.scheduler import TranscriptionScheduler
+
+
+class FakePool:
+    tiers = ["small", "base", "tiny"]
+
+
+def test_idle_scheduler_keeps_the_best_model(monkeypatch):
+    scheduler = TranscriptionScheduler(
+        slots=1, per_user=1, max_wait=600, quota_seconds=3600, quota_per_hour=3600,
+        realtime_factor=0.5, reserve_seconds=600,
+    )
+    monkeypatch.setattr(transcribe, "scheduler", scheduler)
+    monkeypatch.setattr(transcribe, "model_policy", ModelPolicy(FakePool(), downgrade_seconds=[120, 600]))
+    audio = DecodedAudio(np.zeros(60 * SAMPLE_RATE, np.float32), "md5")
+
+    with scheduler.admit("user"):
+        assert transcribe.choose_model("user", audio, "auto") == "small"
+
+
+def test_busy_scheduler_picks_a_faster_model():
+    policy = ModelPolicy(FakePool(), downgrade_seconds=[120, 600])
+
+    assert policy.choose("auto", 60) == "small"
+    assert policy.choose("auto", 300) == "base"
+    assert policy.choose("auto", 900) == "tiny"
+    assert policy.choose("best", 900) == "small"
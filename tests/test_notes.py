@@ -0,0 +1,89 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from app.tools import notes
+from app.tools.notes import NotesStore
+
+
+def test_update_without_notes_file_raises_404(monkeypatch):
+    async def find_notes_file(access_token):
+        return None
+
+    monkeypatch.setattr(notes.drive, "find_notes_file", find_notes_file)
+    applied = []
+    store = NotesStore()
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(store.update("user", "expired-token", applied.append))
+
+    assert error.value.status_code == 404
+    assert applied == []
+    assert store.entries == {}
+
+
+class FakeDrive:
+    """
+    One notes.json per access token; writes for tokens in `blocked` wait until it is set.
+    """
+
+    def __init__(self):
+        self.blocked = {}
+        self.writes = []
+
+    async def find_notes_file(self, access_token):
+        return {"id": f"notes-{access_token}", "version": "1"}
+
+    async def get_version(self, file_id, access_token):
+        return "1"
+
+    async def read_json(self, file_id, access_token, default=None):
+        return []
+
+    async def write_json(self, file_id, access_token, data):
+        self.writes.append(access_token)
+        if access_token in self.blocked:
+            await self.blocked[access_token].wait()
+        return httpx.Response(200, json={"version": "1"})
+
+
+def use_fake_drive(monkeypatch) -> FakeDrive:
+    fake = FakeDrive()
+    for name in ("find_notes_file", "get_version", "read_json", "write_json"):
+        monkeypatch.setattr(notes.drive, name, getattr(fake, name))
+    return fake
+
+
+def test_lock_is_dropped_when_no_notes_file(monkeypatch):
+    async def find_notes_file(access_token):
+        return None
+
+    monkeypatch.setattr(notes.drive, "find_notes_file", find_notes_file)
+    store = NotesStore()
+
+    with pytest.raises(HTTPException):
+        asyncio.run(store.update("user", "token", lambda notes: None))
+    assert store.locks == {}
+
+
+def test_evicting_a_user_keeps_their_lock_while_updating(monkeypatch):
+    fake = use_fake_drive(monkeypatch)
+    store = NotesStore(max_users=1)
+
+    async def run():
+        fake.blocked["a"] = asyncio.Event()
+        first = asyncio.create_task(store.update("user-a", "a", lambda notes: None))
+        await asyncio.sleep(0.01)
+        # Caching user-b evicts user-a while user-a's write is still in flight
+        await store.update("user-b", "b", lambda notes: None)
+        second = asyncio.create_task(store.update("user-a", "a", lambda notes: None))
+        await asyncio.sleep(0.01)
+        assert fake.writes == ["a", "b"]
+        fake.blocked["a"].set()
+        await asyncio.gather(first, second)
+
+    asyncio.run(run())
+    assert fake.writes == ["a", "b", "a"]
+    assert set(store.locks) == set(store.entries) == {"user-a"}
@@ -0,0 +1,127 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.tools.scheduler import TranscriptionScheduler
+
+
+def make_scheduler(**overrides):
+    options = {
+        "slots": 1, "per_user": 1, "max_wait": 600, "quota_seconds": 3600, "quota_per_hour": 3600,
+        "realtime_factor": 0.5, "reserve_seconds": 600,
+    }
+    return TranscriptionScheduler(**{**options, **overrides})
+
+
+def test_admitted_requests_count_before_they_queue():
+    scheduler = make_scheduler()
+    reservations = [scheduler.admit(f"user-{i}") for i in range(3)]
+
+    with pytest.raises(HTTPException) as error:
+        scheduler.admit("user-3")
+    assert error.value.status_code == 429
+
+    reservations[0].release()
+    scheduler.admit("user-3")
+
+
+def test_slot_replaces_the_placeholder():
+    scheduler = make_scheduler()
+
+    async def run():
+        with scheduler.admit("user"):
+            async with scheduler.slot("user", 60):
+                assert scheduler.reserved == {}
+                assert scheduler.in_use == 1
+
+    asyncio.run(run())
+    assert scheduler.reserved == {}
+    assert scheduler.in_use == 0
+
+
+def test_quota_without_refill_is_refused():
+    scheduler = make_scheduler(quota_seconds=0, quota_per_hour=0)
+
+    with pytest.raises(HTTPException) as error:
+        scheduler.admit("user")
+    assert error.value.status_code == 429
+    assert error.value.headers["Retry-After"] == "86400"
+
+
+def test_fractional_share_runs_one_job_at_a_time():
+    scheduler = make_scheduler(slots=0.25)
+    running = []
+
+    async def job(user_id):
+        async with scheduler.slot(user_id, 60):
+            running.append(len(scheduler.running_jobs))
+            await asyncio.sleep(0.01)
+
+    async def run():
+        await asyncio.gather(job("a"), job("b"))
+
+    asyncio.run(run())
+    assert running == [1, 1]
+
+
+def test_wide_job_holds_a_slot_per_worker():
+    scheduler = make_scheduler(slots=2)
+    order = []
+
+    async def wide():
+        async with scheduler.slot("a", 600, width=4):
+            assert scheduler.in_use == 2
+            # Half the audio per slot: 600 s at 0.5 realtime over 2 slots
+            assert 140 < scheduler.estimated_wait("b") <= 150
+            await asyncio.sleep(0.02)
+            order.append("wide")
+
+    async def narrow():
+        await asyncio.sleep(0.01)
+        async with scheduler.slot("b", 60):
+            order.append("narrow")
+
+    async def run():
+        await asyncio.gather(wide(), narrow())
+
+    asyncio.run(run())
+    assert order == ["wide", "narrow"]
+
+
+def test_reservation_starts_when_its_job_gets_a_slot():
+    scheduler = make_scheduler()
+    started = []
+
+    async def other():
+        async with scheduler.slot("other", 60):
+            await asyncio.sleep(0.02)
+
+    async def job():
+        await asyncio.sleep(0.01)
+        reservation = scheduler.admit("user")
+        reservation.on_start = lambda: started.append(scheduler.in_use)
+        with reservation:
+            task = asyncio.create_task(enter_slot())
+            await asyncio.sleep(0)
+            assert started == []
+            await task
+
+    async def enter_slot():
+        async with scheduler.slot("user", 60):
+            pass
+
+    async def run():
+        await asyncio.gather(other(), job())
+
+    asyncio.run(run())
+    assert started == [1]
+
+
+def test_admitted_job_does_not_wait_on_its_own_placeholder():
+    scheduler = make_scheduler()
+
+    with scheduler.admit("user"):
+        assert scheduler.estimated_wait("user", admitted=True) == 0
+        # A second request from the same user still queues behind the first
+        assert scheduler.estimated_wait("user") > 0
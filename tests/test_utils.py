@@ -0,0 +1,42 @@
+from app.tools.utils import StreamingTextCleaner, clean_text, parse_json_object
+
+
+def stream(chunks: list[str]) -> str:
+    cleaner = StreamingTextCleaner()
+    return "".join(cleaner.feed(chunk) for chunk in chunks) + cleaner.flush()
+
+
+def test_escaped_quote_split_across_chunks_is_removed():
+    assert stream(["\\", '"x']) == "x"
+
+
+def test_streamed_output_matches_clean_text():
+    text = 'He said \\"hello\\" and "bye" \\ done'
+    for size in range(1, 6):
+        chunks = [text[i:i + size] for i in range(0, len(text), size)]
+        assert stream(chunks) == clean_text(text)
+
+
+def test_trailing_backslash_is_flushed():
+    cleaner = StreamingTextCleaner()
+    assert cleaner.feed("end\\") == "end"
+    assert cleaner.flush() == ""
+
+
+def test_parse_json_object_strips_code_fences():
+    assert parse_json_object('```json\n{"title": "A", "content": "B"}\n```') == {"title": "A", "content": "B"}
+
+
+def test_parse_json_object_finds_object_in_surrounding_text():
+    assert parse_json_object('Sure! {"title": "A"} Hope this helps.') == {"title": "A"}
+
+
+def test_parse_json_object_accepts_raw_newlines_in_strings():
+    assert parse_json_object('{"content": "line one\nline two"}') == {"content": "line one\nline two"}
+
+
+def test_parse_json_object_rejects_non_objects():
+    assert parse_json_object("not json") is None
+    assert parse_json_object("[1, 2]") is None
+    assert parse_json_object("") is None
+    assert parse_json_object(None) is None